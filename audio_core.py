@@ -0,0 +1,516 @@
+import math
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def _build_ulaw_tables():
+    # G.711 μ-law, built once for every int16 value / every code byte
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    sign = np.where(samples < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(samples), 32635) + 0x84
+    exponent = np.frexp(magnitude)[1] - 8
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    encode = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+    # index the encode table by the raw uint16 bit pattern of the sample
+    encode = np.roll(encode, -32768)
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F) << 3) + 0x84 << exponent) - 0x84
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+    return encode, decode
+
+
+ULAW_ENCODE_TABLE, ULAW_DECODE_TABLE = _build_ulaw_tables()
+
+
+def ulaw_encode(samples: np.ndarray) -> np.ndarray:
+    return ULAW_ENCODE_TABLE[samples.astype(np.int16).view(np.uint16)]
+
+
+def ulaw_decode(codes: np.ndarray) -> np.ndarray:
+    return ULAW_DECODE_TABLE[codes]
+
+
+ADPCM_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209,
+    230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876,
+    963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749,
+    3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630,
+    9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385,
+    24623, 27086, 29794, 32767,
+]
+ADPCM_INDEX_SHIFT = [-1, -1, -1, -1, 2, 4, 6, 8] * 2
+
+
+def _adpcm_delta(step: int, nibble: int) -> int:
+    delta = step >> 3
+    if nibble & 4:
+        delta += step
+    if nibble & 2:
+        delta += step >> 1
+    if nibble & 1:
+        delta += step >> 2
+    return -delta if nibble & 8 else delta
+
+
+# predictor change and next step index for every (step index, nibble)
+ADPCM_DELTAS = [
+    [_adpcm_delta(step, nibble) for nibble in range(16)] for step in ADPCM_STEPS
+]
+ADPCM_NEXT_INDEX = [
+    [min(88, max(0, index + ADPCM_INDEX_SHIFT[nibble])) for nibble in range(16)]
+    for index in range(len(ADPCM_STEPS))
+]
+ADPCM_HEADER = struct.Struct("<hBB")  # predictor, step index, padding nibble
+
+
+def adpcm_encode(samples: np.ndarray, state: tuple = (0, 0)):
+    """IMA-ADPCM encode one block, returns (payload, state for the next block).
+
+    Every block starts with the encoder state, so blocks decode on their
+    own and a lost packet does not corrupt the ones after it.
+    """
+    predictor, index = state
+    header = ADPCM_HEADER.pack(predictor, index, len(samples) % 2)
+    nibbles = bytearray(len(samples))
+    steps, deltas, next_index = ADPCM_STEPS, ADPCM_DELTAS, ADPCM_NEXT_INDEX
+    # the predictor depends on every previous sample, so this part is scalar
+    for i, sample in enumerate(samples.tolist()):
+        step = steps[index]
+        diff = sample - predictor
+        nibble = 0
+        if diff < 0:
+            nibble = 8
+            diff = -diff
+        if diff >= step:
+            nibble |= 4
+            diff -= step
+        if diff >= step >> 1:
+            nibble |= 2
+            diff -= step >> 1
+        if diff >= step >> 2:
+            nibble |= 1
+        predictor += deltas[index][nibble]
+        if predictor > 32767:
+            predictor = 32767
+        elif predictor < -32768:
+            predictor = -32768
+        index = next_index[index][nibble]
+        nibbles[i] = nibble
+
+    nibbles = np.frombuffer(nibbles, np.uint8)
+    if len(nibbles) % 2:
+        nibbles = np.append(nibbles, np.uint8(0))
+    packed = nibbles[0::2] | (nibbles[1::2] << 4)
+    return header + packed.tobytes(), (predictor, index)
+
+
+def adpcm_decode(payload: bytes) -> np.ndarray:
+    predictor, index, padding = ADPCM_HEADER.unpack_from(payload)
+    packed = np.frombuffer(payload, np.uint8, offset=ADPCM_HEADER.size)
+    nibbles = np.empty(len(packed) * 2, np.uint8)
+    nibbles[0::2] = packed & 0x0F
+    nibbles[1::2] = packed >> 4
+    if padding:
+        nibbles = nibbles[:-1]
+
+    samples = [0] * len(nibbles)
+    deltas, next_index = ADPCM_DELTAS, ADPCM_NEXT_INDEX
+    for i, nibble in enumerate(nibbles.tolist()):
+        predictor += deltas[index][nibble]
+        if predictor > 32767:
+            predictor = 32767
+        elif predictor < -32768:
+            predictor = -32768
+        index = next_index[index][nibble]
+        samples[i] = predictor
+    return np.array(samples, np.int16)
+
+
+def level_db(samples: np.ndarray) -> float:
+    """RMS level in dBFS"""
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+    return float(20 * np.log10(rms / 32768 + 1e-9))
+
+
+def zero_crossing_rate(samples: np.ndarray) -> float:
+    signs = np.signbit(samples)
+    return np.count_nonzero(signs[1:] != signs[:-1]) / max(1, len(samples) - 1)
+
+
+class VoiceActivityDetector:
+    """Energy / zero-crossing voice activity detection with hangover.
+
+    A block is speech when it is louder than both threshold_db and the
+    tracked noise floor plus margin_db, and is not hiss-like (too many
+    zero crossings) unless it is very loud. After speech, hangover_blocks
+    more blocks are still reported active so word endings are not clipped.
+
+    The noise floor follows the quietest of the last floor_window blocks,
+    whatever they were classified as: speech has pauses, steady noise
+    (a fan) does not, so the floor rises to the noise and stops sending it.
+    """
+
+    def __init__(
+        self,
+        threshold_db: float = -50.0,
+        margin_db: float = 9.0,
+        zcr_max: float = 0.35,
+        hangover_blocks: int = 8,
+        floor_window: int = 75,
+        floor_rise: float = 0.1,
+    ):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_max = zcr_max
+        self.hangover_blocks = hangover_blocks
+        self.floor_window = floor_window
+        self.floor_rise = floor_rise
+
+        self.noise_floor = threshold_db
+        self.recent_levels = deque()
+        self.hangover = 0
+        self.active = False
+        self.speech_blocks = 0
+        self.silent_blocks = 0
+
+    def process(self, samples: np.ndarray) -> bool:
+        """True while blocks should be sent (speech or hangover)"""
+        level = level_db(samples)
+        self.update_noise_floor(level)
+        threshold = max(self.threshold_db, self.noise_floor + self.margin_db)
+        speech = level > threshold and (
+            zero_crossing_rate(samples) <= self.zcr_max or level > threshold + 10
+        )
+        if speech:
+            self.hangover = self.hangover_blocks
+        else:
+            self.hangover = max(0, self.hangover - 1)
+
+        self.active = speech or self.hangover > 0
+        if self.active:
+            self.speech_blocks += 1
+        else:
+            self.silent_blocks += 1
+        return self.active
+
+    def update_noise_floor(self, level: float):
+        self.recent_levels.append(level)
+        while len(self.recent_levels) > self.floor_window:
+            self.recent_levels.popleft()
+        # the floor drops to the recent minimum at once and rises to it slowly
+        minimum = min(self.recent_levels)
+        if minimum < self.noise_floor:
+            self.noise_floor = minimum
+        else:
+            self.noise_floor += self.floor_rise * (minimum - self.noise_floor)
+
+    def get_stats(self) -> dict:
+        total = self.speech_blocks + self.silent_blocks
+        return {
+            "speech_blocks": self.speech_blocks,
+            "silent_blocks": self.silent_blocks,
+            "suppressed_ratio": self.silent_blocks / total if total else 0.0,
+            "noise_floor_db": self.noise_floor,
+        }
+
+
+class ActiveSpeakerDetector:
+    """Picks the active speaker from per-participant levels, with hysteresis.
+
+    Levels are smoothed, and another participant only takes over after being
+    the loudest, by switch_margin_db over the current speaker, for hold_time
+    seconds; a current speaker who goes quiet keeps the floor until then.
+    """
+
+    def __init__(
+        self,
+        threshold_db: float = -40.0,
+        switch_margin_db: float = 6.0,
+        hold_time: float = 1.0,
+        smoothing: float = 0.3,
+    ):
+        self.threshold_db = threshold_db
+        self.switch_margin_db = switch_margin_db
+        self.hold_time = hold_time
+        self.smoothing = smoothing
+
+        self.levels = {}  # name -> smoothed level (dBFS)
+        self.speaker = None
+        self.candidate = None
+        self.candidate_since = 0.0
+        self.switches = 0
+
+    def update(self, levels: dict, now: float = None) -> str:
+        """levels: name -> dBFS of the last block, missing names were silent"""
+        now = time.time() if now is None else now
+        for name in self.levels.keys() | levels.keys():
+            level = max(levels.get(name, -100.0), -100.0)
+            previous = self.levels.get(name, level)
+            self.levels[name] = previous + self.smoothing * (level - previous)
+
+        loudest = max(self.levels, key=self.levels.get, default=None)
+        if loudest is None or self.levels[loudest] < self.threshold_db:
+            self.candidate = None
+            return self.speaker
+        if loudest == self.speaker:
+            self.candidate = None
+            return self.speaker
+        current = self.levels.get(self.speaker, -100.0)
+        if self.levels[loudest] < current + self.switch_margin_db:
+            self.candidate = None
+            return self.speaker
+
+        if loudest != self.candidate:
+            self.candidate = loudest
+            self.candidate_since = now
+        if self.speaker is None or now - self.candidate_since >= self.hold_time:
+            self.speaker = loudest
+            self.candidate = None
+            self.switches += 1
+        return self.speaker
+
+    def remove(self, name: str):
+        self.levels.pop(name, None)
+        if self.candidate == name:
+            self.candidate = None
+        if self.speaker == name:
+            self.speaker = None
+
+    def get_stats(self) -> dict:
+        return {"speaker": self.speaker, "switches": self.switches}
+
+
+def comfort_noise(level: float, n_samples: int) -> np.ndarray:
+    """White noise at the given dBFS level"""
+    amplitude = 32768 * 10 ** (level / 20)
+    noise = np.random.normal(0, amplitude, n_samples)
+    return np.clip(noise, -32768, 32767).astype(np.int16)
+
+
+class JitterBuffer:
+    """Per-sender audio playout buffer keyed by sequence number.
+
+    The target depth follows the interarrival jitter (RFC 3550 estimate)
+    and takes effect whenever the buffer (re)fills, i.e. at the start of
+    every talkspurt. A missing block is concealed by repeating the last
+    one with a fade; more than max_conceal missing blocks in a row is an
+    underrun and playout waits for the buffer to refill.
+    """
+
+    def __init__(
+        self,
+        block_ms: float,
+        min_delay_ms: float = 40,
+        max_delay_ms: float = 400,
+        max_conceal: int = 4,
+        fade: float = 0.6,
+    ):
+        self.block_ms = block_ms
+        self.min_blocks = max(1, math.ceil(min_delay_ms / block_ms))
+        self.max_blocks = max(self.min_blocks, math.ceil(max_delay_ms / block_ms))
+        self.max_conceal = max_conceal
+        self.fade = fade
+
+        self.lock = threading.Lock()
+        self.blocks = {}  # seq -> (pcm bytes, is comfort noise, capture time)
+        self.played_timestamp = None  # capture time of the block get() returned
+        self.target = self.min_blocks
+        self.jitter = 0.0  # seconds
+        self.last_transit = None
+        self.reset()
+
+        self.received = 0
+        self.late = 0
+        self.dropped = 0
+        self.concealed = 0
+        self.underruns = 0
+
+    def reset(self):
+        with self.lock:
+            self.blocks.clear()
+            self.next_seq = None  # None while filling
+            self.last_block = None
+            self.comfort = None  # (level, samples) of the noise played while filling
+            self.conceal_run = 0
+
+    def put(self, seq: int, timestamp: float, data: bytes, silence: bool = False):
+        # sender and receiver clocks differ, but only differences are used
+        transit = time.time() - timestamp
+        with self.lock:
+            if self.last_transit is not None:
+                deviation = abs(transit - self.last_transit)
+                self.jitter += (deviation - self.jitter) / 16
+            self.last_transit = transit
+
+            if self.next_seq is not None and seq < self.next_seq:
+                self.late += 1
+                return
+            self.blocks[seq] = (data, silence, timestamp)
+            self.received += 1
+            while len(self.blocks) > 2 * self.max_blocks:
+                del self.blocks[min(self.blocks)]
+                self.dropped += 1
+
+    def target_blocks(self) -> int:
+        blocks = math.ceil(3 * self.jitter * 1000 / self.block_ms) + 1
+        return min(self.max_blocks, max(self.min_blocks, blocks))
+
+    def get(self):
+        """Next block to play, or None when there is nothing to play"""
+        with self.lock:
+            self.played_timestamp = None
+            if self.next_seq is None:
+                first = min(self.blocks, default=None)
+                # comfort noise needs no buffering, speech waits for the target
+                silent = first is not None and self.blocks[first][1]
+                if len(self.blocks) < self.target and not silent:
+                    return self._comfort_noise()
+                self.next_seq = first
+            elif len(self.blocks) > self.target + 2:
+                # jitter went down, skip a block to cut the delay
+                self.blocks.pop(self.next_seq, None)
+                self.next_seq += 1
+                self.dropped += 1
+
+            entry = self.blocks.pop(self.next_seq, None)
+            if entry is None:
+                return self._conceal()
+            self.next_seq += 1
+            self.conceal_run = 0
+            data, silence, timestamp = entry
+            if silence:
+                # gaps are expected until speech resumes, refill then
+                if data is not None:
+                    samples = np.frombuffer(data, np.int16)
+                    self.comfort = (level_db(samples), len(samples))
+                else:
+                    self.comfort = None
+                self.last_block = None
+                self.next_seq = None
+                self.target = self.target_blocks()
+                return data
+            self.comfort = None
+            self.last_block = data
+            self.played_timestamp = timestamp
+            return data
+
+    def _comfort_noise(self):
+        # a fresh block every time, repeating one block is heard as a buzz
+        if self.comfort is None:
+            return None
+        return comfort_noise(*self.comfort).tobytes()
+
+    def _conceal(self):
+        self.conceal_run += 1
+        if self.conceal_run > self.max_conceal or self.last_block is None:
+            self.underruns += 1
+            self.next_seq = None
+            self.conceal_run = 0
+            self.target = min(self.max_blocks, self.target_blocks() + 1)
+            return None
+        # a later block means this one was lost; otherwise it may still come
+        if self.blocks:
+            self.next_seq += 1
+        self.concealed += 1
+        samples = np.frombuffer(self.last_block, np.int16)
+        return (samples * self.fade**self.conceal_run).astype(np.int16).tobytes()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "playout_delay_ms": len(self.blocks) * self.block_ms,
+                "target_delay_ms": self.target * self.block_ms,
+                "jitter_ms": self.jitter * 1000,
+                "received": self.received,
+                "late": self.late,
+                "dropped": self.dropped,
+                "concealed": self.concealed,
+                "underruns": self.underruns,
+            }
+
+
+class AudioRingBuffer:
+    """Preallocated ring of int16 samples for one writer and one reader.
+
+    The PortAudio callback writes and the sender reads. Each side only
+    moves its own position, so neither ever waits on a lock held by the
+    other; the event only wakes a reader that is waiting for data.
+    """
+
+    def __init__(self, capacity: int):
+        self.buffer = np.zeros(capacity, np.int16)
+        self.capacity = capacity
+        self.write_pos = 0  # samples ever written, moved by the writer only
+        self.read_pos = 0  # samples ever read or skipped, moved by the reader only
+        self.data_ready = threading.Event()
+
+        self.overflows = 0
+        self.underflows = 0
+        self.skipped = 0
+
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def write(self, samples: np.ndarray) -> bool:
+        n = len(samples)
+        if n > self.capacity - self.available():
+            # the reader fell behind, drop the new samples
+            self.overflows += 1
+            return False
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start : start + first] = samples[:first]
+        self.buffer[: n - first] = samples[first:]
+        self.write_pos += n
+        self.data_ready.set()
+        return True
+
+    def read(self, n: int, timeout: float = None, max_backlog: int = None):
+        """Next n samples, or None if they did not arrive within timeout.
+
+        With max_backlog, older samples beyond it are skipped so a late
+        reader catches up instead of sending stale audio.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.available() < n:
+            self.data_ready.clear()
+            if self.available() >= n:
+                break
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            if not self.data_ready.wait(remaining):
+                self.underflows += 1
+                return None
+
+        if max_backlog is not None and self.available() > max_backlog:
+            skip = self.available() - max_backlog
+            self.read_pos += skip
+            self.skipped += skip
+
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        samples = np.empty(n, np.int16)
+        samples[:first] = self.buffer[start : start + first]
+        samples[first:] = self.buffer[: n - first]
+        self.read_pos += n
+        return samples
+
+    def clear(self):
+        """Drop everything buffered, called from the reader side"""
+        self.read_pos = self.write_pos
+
+    def get_stats(self) -> dict:
+        return {
+            "buffered": self.available(),
+            "overflows": self.overflows,
+            "underflows": self.underflows,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,60 @@
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ChatMessage:
+    from_name: str
+    to_name: str
+    text: str
+    timestamp: float = field(default_factory=time.time)
+    id: int = None  # assigned by the ChatStore
+
+
+class ChatStore:
+    """Every chat message of the meeting, so the view only keeps a window.
+
+    Backed by sqlite; ":memory:" keeps the history for this session only.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, "
+            "from_name TEXT, to_name TEXT, text TEXT, timestamp REAL)"
+        )
+
+    def add(self, msg: ChatMessage) -> ChatMessage:
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO messages (from_name, to_name, text, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (msg.from_name, msg.to_name, msg.text, msg.timestamp),
+            )
+        msg.id = cursor.lastrowid
+        return msg
+
+    def before(self, msg_id: int, limit: int) -> list:
+        """Up to limit messages older than msg_id, oldest first"""
+        rows = self.db.execute(
+            "SELECT from_name, to_name, text, timestamp, id FROM messages "
+            "WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (msg_id, limit),
+        ).fetchall()
+        return [ChatMessage(*row) for row in reversed(rows)]
+
+    def after(self, msg_id: int, limit: int) -> list:
+        """Up to limit messages newer than msg_id, oldest first"""
+        rows = self.db.execute(
+            "SELECT from_name, to_name, text, timestamp, id FROM messages "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (msg_id, limit),
+        ).fetchall()
+        return [ChatMessage(*row) for row in rows]
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def close(self):
+        self.db.close()
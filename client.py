@@ -3,11 +3,26 @@ import time
 import sys
 import socket
 import pickle
+import threading
 from collections import defaultdict
 
 from PyQt6.QtCore import QThreadPool, QRunnable, QThread, pyqtSignal, pyqtSlot
 from PyQt6.QtWidgets import QApplication, QMessageBox
-from qt_gui import MainWindow, Camera, Microphone, Worker
+from qt_gui import (
+    MainWindow,
+    Camera,
+    Microphone,
+    Worker,
+    VIDEO_CODECS,
+    AUDIO_CODECS,
+    DEFAULT_AUDIO_CONFIG,
+    JITTER_MIN_DELAY_MS,
+    JITTER_MAX_DELAY_MS,
+)
+from codec_core import codec_registry
+from audio_core import JitterBuffer
+from sync_core import AVSyncController
+from video_core import LatestFrameSlot
 
 from constants import *
 
@@ -15,6 +30,8 @@ IP = socket.gethostbyname(socket.gethostname())
 # IP = "172.17.192.1"
 VIDEO_ADDR = (IP, VIDEO_PORT)
 AUDIO_ADDR = (IP, AUDIO_PORT)
+KEYFRAME_REQUEST_INTERVAL = 1.0  # seconds between keyframe requests per sender
+RECEIVER_REPORT_INTERVAL = 1.0  # seconds between reports to each video sender
 
 
 class Client:
@@ -22,8 +39,29 @@ class Client:
         self.name = name
         self.current_device = current_device
 
+        # frame on screen, and the slot the next one to show is written to
         self.video_frame = None
+        self.video_seq = 0
+        self.video_slot = LatestFrameSlot()
         self.audio_data = None
+        self.jitter_buffer = JitterBuffer(
+            audio_config.packet_ms, JITTER_MIN_DELAY_MS, JITTER_MAX_DELAY_MS
+        )
+        self.av_sync = AVSyncController()
+
+        # what this peer can decode, replaced when it announces its codecs
+        self.codecs = {
+            media: (name,) for media, name in codec_registry.fallback.items()
+        }
+        self.decoders = {}
+        self.last_keyframe_request = 0.0
+
+        # received video since the last receiver report
+        self.video_received = 0
+        self.video_lost = 0
+        self.video_seq_received = None
+        self.last_video_timestamp = None
+        self.last_video_arrival = None
 
         if self.current_device:
             self.camera = Camera()
@@ -32,29 +70,149 @@ class Client:
             self.camera = None
             self.microphone = None
 
+        # set while the stream is on, so loops can block on them while muted
+        self.media_enabled = {VIDEO: threading.Event(), AUDIO: threading.Event()}
         self.camera_enabled = True
         self.microphone_enabled = True
 
+    @property
+    def camera_enabled(self):
+        return self.media_enabled[VIDEO].is_set()
+
+    @camera_enabled.setter
+    def camera_enabled(self, enabled: bool):
+        self.set_media_enabled(VIDEO, enabled)
+
+    @property
+    def microphone_enabled(self):
+        return self.media_enabled[AUDIO].is_set()
+
+    @microphone_enabled.setter
+    def microphone_enabled(self, enabled: bool):
+        self.set_media_enabled(AUDIO, enabled)
+
+    def set_media_enabled(self, media: str, enabled: bool):
+        if media == VIDEO and self.camera is not None:
+            # stop reading the camera altogether while it is off
+            if enabled:
+                self.camera.resume()
+            else:
+                self.camera.pause()
+        if media == AUDIO and self.microphone is not None:
+            if enabled:
+                self.microphone.resume()
+            else:
+                self.microphone.pause()
+        if enabled:
+            self.media_enabled[media].set()
+            return
+        self.media_enabled[media].clear()
+        if media == VIDEO:
+            self.video_frame = None
+            self.av_sync.clear_video()
+            self.video_slot.take(0)
+        elif media == AUDIO:
+            self.audio_data = None
+            self.jitter_buffer.reset()
+
+    def wait_media_enabled(self, media: str, timeout: float = None):
+        return self.media_enabled[media].wait(timeout)
+
+    def get_media_state(self):
+        return {VIDEO: self.camera_enabled, AUDIO: self.microphone_enabled}
+
+    def set_media_state(self, state: dict):
+        for media, enabled in state.items():
+            self.set_media_enabled(media, enabled)
+
     def get_video(self):
         if not self.camera_enabled:
-            self.video_frame = None
             return None
+        self.release_video()
+        item = self.video_slot.take(0)
+        if item is not None:
+            self.video_seq, _, self.video_frame = item
+        return self.video_frame
 
-        if self.camera is not None:
-            self.video_frame = self.camera.get_frame()
+    def has_new_video(self) -> bool:
+        self.release_video()
+        return self.video_slot.has_new(self.video_seq)
 
-        return self.video_frame
+    def release_video(self):
+        # received frames wait until the matching audio is played
+        if self.current_device:
+            return
+        for timestamp, seq, frame in self.av_sync.pop_due():
+            self.video_slot.put(frame, timestamp, seq)
+
+    def get_video_stats(self):
+        return self.video_slot.get_stats()
+
+    def capture_video(self):
+        # only the broadcast loop captures; the local tile shows the raw frame
+        if not self.camera_enabled or self.camera is None:
+            return None
+        payload = self.camera.get_frame()
+        frame = self.camera.last_frame
+        if frame is not None and frame is not self.video_slot.peek()[2]:
+            self.video_slot.put(frame)
+        return payload
+
+    def capture_audio(self):
+        if not self.microphone_enabled or self.microphone is None:
+            return None
+        return self.microphone.get_packet()
+
+    def get_decoder(self, media: str, codec: str):
+        # one decoder per codec, stateful decoders must see this sender's packets only
+        decoder = self.decoders.get((media, codec))
+        if decoder is None:
+            decoder = codec_registry.create(media, codec)
+            self.decoders[(media, codec)] = decoder
+        return decoder
 
     def get_audio(self):
-        if not self.microphone_enabled:
+        """Next block to play; local capture is only read by capture_audio"""
+        if not self.microphone_enabled or self.current_device:
             self.audio_data = None
             return None
 
-        if self.microphone is not None:
-            self.audio_data = self.microphone.get_data()
+        self.audio_data = self.jitter_buffer.get()
+        if self.jitter_buffer.played_timestamp is not None:
+            self.av_sync.on_audio_played(self.jitter_buffer.played_timestamp)
 
         return self.audio_data
 
+    def get_audio_stats(self):
+        return self.jitter_buffer.get_stats()
+
+    def get_av_stats(self):
+        return self.av_sync.get_stats()
+
+    def on_video_packet(self, packet: MediaPacket):
+        # counted on arrival, A/V sync may still drop frames after this
+        last_seq = self.video_seq_received
+        if last_seq is not None and packet.seq > last_seq + 1:
+            self.video_lost += packet.seq - last_seq - 1
+        if last_seq is None or packet.seq > last_seq:
+            self.video_seq_received = packet.seq
+        self.video_received += 1
+        self.last_video_timestamp = packet.timestamp
+        self.last_video_arrival = time.time()
+
+    def receiver_report(self):
+        """Video loss since the last report and a timestamp echo for the RTT"""
+        received, lost = self.video_received, self.video_lost
+        if not received:
+            return None
+        self.video_received = self.video_lost = 0
+        return {
+            "loss": lost / (lost + received),
+            "echo": self.last_video_timestamp,
+            # how long the echoed packet was held here, not part of the RTT
+            "delay": time.time() - self.last_video_arrival,
+        }
+
 
 class ServerConnection(QThread):
     add_client_signal = pyqtSignal(Client)
@@ -71,6 +229,7 @@ class ServerConnection(QThread):
 
         self.connected = False
         self.recieving_filename = None
+        self.send_lock = threading.Lock()  # main socket is written from several threads
 
     def run(self):
         self.init_conn()  # Connect to all servers and send name
@@ -79,8 +238,10 @@ class ServerConnection(QThread):
 
         self.add_client_signal.emit(client)
 
+        # this thread only sends receiver reports until disconnected
         while self.connected:
-            pass
+            time.sleep(RECEIVER_REPORT_INTERVAL)
+            self.send_receiver_reports()
         self.disconnect_server()
 
     def init_conn(self):
@@ -97,6 +258,8 @@ class ServerConnection(QThread):
 
         self.send_msg(self.video_socket, Message(self.name, ADD, VIDEO))
         self.send_msg(self.audio_socket, Message(self.name, ADD, AUDIO))
+        self.send_media_state()
+        self.send_codecs()
 
         self.connected = True
 
@@ -145,7 +308,8 @@ class ServerConnection(QThread):
             elif msg.data_type == AUDIO:
                 conn.sendto(msg_bytes, AUDIO_ADDR)
             else:
-                conn.send_bytes(msg_bytes)
+                with self.send_lock:
+                    conn.send_bytes(msg_bytes)
         except (BrokenPipeError, ConnectionResetError, OSError):
             print(f"[ERROR] Connection not present")
             self.connected = False
@@ -162,18 +326,66 @@ class ServerConnection(QThread):
             self.send_msg(self.main_socket, msg)
         self.add_msg_signal.emit(self.name, f"File {filename} sent.")
 
+    def send_media_state(self):
+        # receivers render mute placeholders from this, not from empty packets
+        msg = Message(self.name, POST, STATE, client.get_media_state())
+        self.send_msg(self.main_socket, msg)
+
+    def send_subscription(self, media: str, sizes: dict):
+        # the server stops forwarding media from anyone not in sizes, and asks
+        # the rest not to send video larger than the tile it is shown in
+        self.send_msg(self.main_socket, Message(self.name, SUBSCRIBE, media, sizes))
+
+    def send_codecs(self):
+        msg = Message(self.name, POST, CODECS, codec_registry.capabilities())
+        self.send_msg(self.main_socket, msg)
+
+    def request_keyframe(self, sender: Client):
+        now = time.time()
+        if now - sender.last_keyframe_request < KEYFRAME_REQUEST_INTERVAL:
+            return
+        sender.last_keyframe_request = now
+        msg = Message(self.name, KEYFRAME, to_names=(sender.name,))
+        self.send_msg(self.main_socket, msg)
+
+    def update_codecs(self):
+        peers = tuple(all_clients.values())
+        preferred = {VIDEO: VIDEO_CODECS, AUDIO: AUDIO_CODECS}
+        devices = {VIDEO: client.camera, AUDIO: client.microphone}
+        for media, device in devices.items():
+            if device is None:
+                continue
+            fallback = (codec_registry.fallback[media],)
+            peer_codecs = [peer.codecs.get(media, fallback) for peer in peers]
+            device.set_codec(
+                codec_registry.negotiate(media, preferred[media], peer_codecs)
+            )
+
     def media_broadcast_loop(self, conn: socket.socket, media: str):
         while self.connected:
+            # nothing is captured or sent while muted
+            if not client.wait_media_enabled(media, timeout=0.5):
+                continue
             if media == VIDEO:
-                data = client.get_video()
+                data = client.capture_video()
             elif media == AUDIO:
-                data = client.get_audio()
+                data = client.capture_audio()
             else:
                 print(f"[ERROR] Invalid media type")
                 break
+            if data is None:
+                continue
             msg = Message(self.name, POST, media, data)
             self.send_msg(conn, msg)
 
+    def send_receiver_reports(self):
+        for sender in tuple(all_clients.values()):
+            report = sender.receiver_report()
+            if report is None:
+                continue
+            msg = Message(self.name, POST, REPORT, report, (sender.name,))
+            self.send_msg(self.main_socket, msg)
+
     def handle_conn(self, conn: socket.socket, media: str):
         while self.connected:
             if media in [VIDEO, AUDIO]:
@@ -202,13 +414,26 @@ class ServerConnection(QThread):
         global all_clients
         client_name = msg.from_name
         if msg.request == POST:
+            if msg.data_type == CONFIG:
+                self.set_audio_config(msg.data)
+                return
+            if msg.data_type == RESOLUTION:
+                client.camera.set_max_resolution(msg.data)
+                return
             if client_name not in all_clients:
                 print(f"[{self.name}] [ERROR] Invalid client name {client_name}: {msg}")
                 return
             if msg.data_type == VIDEO:
-                all_clients[client_name].video_frame = msg.data
+                self.handle_video(all_clients[client_name], msg.data)
             elif msg.data_type == AUDIO:
-                all_clients[client_name].audio_data = msg.data
+                self.handle_audio(all_clients[client_name], msg.data)
+            elif msg.data_type == STATE:
+                all_clients[client_name].set_media_state(msg.data)
+            elif msg.data_type == CODECS:
+                all_clients[client_name].codecs = msg.data
+                self.update_codecs()
+            elif msg.data_type == REPORT:
+                self.handle_report(msg.data)
             elif msg.data_type == TEXT:
                 self.add_msg_signal.emit(client_name, msg.data)
             elif msg.data_type == FILE:
@@ -240,14 +465,55 @@ class ServerConnection(QThread):
                 return
             all_clients[client_name] = Client(client_name)
             self.add_client_signal.emit(all_clients[client_name])
+            self.update_codecs()
         elif msg.request == RM:
             if client_name not in all_clients:
                 print(f"[{self.name}] [ERROR] Invalid client name {client_name}")
                 return
             self.remove_client_signal.emit(client_name)
             all_clients.pop(client_name)
+            self.update_codecs()
+        elif msg.request == KEYFRAME:
+            if client.camera is not None:
+                client.camera.request_keyframe()
+
+    def set_audio_config(self, config: AudioConfig):
+        # sent before any other participant is added, so their jitter
+        # buffers are created with the meeting's packet duration
+        global audio_config
+        audio_config = config
+        if client.microphone is not None:
+            client.microphone.configure(config)
+
+    def handle_report(self, report: dict):
+        if client.camera is None:
+            return
+        # the echoed timestamp is our capture time, so this includes encoding
+        rtt = time.time() - report["echo"] - report["delay"]
+        client.camera.on_feedback(report["loss"], rtt)
+
+    def handle_video(self, sender: Client, packet: MediaPacket):
+        sender.on_video_packet(packet)
+        decoder = sender.get_decoder(VIDEO, packet.codec)
+        if not decoder.stateful:
+            # decoded at render time, and only if the frame gets shown
+            sender.av_sync.push_video(packet.timestamp, packet, packet.seq)
+            return
+        # stateful frames build on the previous one, so every one is decoded here
+        frame = decoder.decode(packet.payload)
+        if frame is None:
+            self.request_keyframe(sender)
+            return
+        sender.av_sync.push_video(packet.timestamp, frame, packet.seq)
+
+    def handle_audio(self, sender: Client, packet: MediaPacket):
+        decoder = sender.get_decoder(AUDIO, packet.codec)
+        silence = packet.codec == COMFORT_NOISE_CODEC
+        data = decoder.decode(packet.payload)
+        sender.jitter_buffer.put(packet.seq, packet.timestamp, data, silence)
 
 
+audio_config = DEFAULT_AUDIO_CONFIG
 client = Client("You", current_device=True)
 
 all_clients = defaultdict(lambda: Client(""))
@@ -264,7 +530,7 @@ if __name__ == "__main__":
 
     if hasattr(client, "camera") and client.camera:
         try:
-            client.camera.cap.release()
+            client.camera.release()
         except:
             pass
 
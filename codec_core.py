@@ -0,0 +1,261 @@
+import time
+from functools import partial
+
+import cv2
+import numpy as np
+
+from constants import *
+from audio_core import (
+    ulaw_encode,
+    ulaw_decode,
+    adpcm_encode,
+    adpcm_decode,
+    comfort_noise,
+)
+from video_core import (
+    TileEncoder,
+    TileDecoder,
+    encode_jpeg,
+    decode_jpeg,
+    jpeg_params,
+    payload_size,
+)
+
+
+class Codec:
+    """One direction of one stream: encode() on the sender, decode() on a receiver.
+
+    Stateful codecs depend on earlier packets, so receivers decode every
+    packet as it arrives instead of only the frames that get displayed.
+    """
+
+    name = None
+    media = None
+    stateful = False
+
+    def encode(self, data, quality: int = None):
+        raise NotImplementedError
+
+    def decode(self, payload, size: tuple = None):
+        """size is the (w, h) the caller will scale video to, a hint only"""
+        raise NotImplementedError
+
+    def commit(self, payload):
+        """Called once an encoded payload is actually going to be sent"""
+
+    def request_keyframe(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {}
+
+
+class VideoCodec(Codec):
+    media = VIDEO
+
+
+class JpegCodec(VideoCodec):
+    def __init__(self, quality: int = None):
+        # a fixed quality ignores the bitrate controller
+        self.fixed_quality = quality
+
+    def encode(self, frame, quality: int = None):
+        return encode_jpeg(frame, jpeg_params(self.fixed_quality or quality or 90))
+
+    def decode(self, payload, size: tuple = None):
+        return decode_jpeg(payload, size)
+
+
+class WebpCodec(VideoCodec):
+    def encode(self, frame, quality: int = None):
+        ok, buf = cv2.imencode(
+            ".webp", frame, [int(cv2.IMWRITE_WEBP_QUALITY), int(quality or 90)]
+        )
+        return buf if ok else None
+
+    def decode(self, payload, size: tuple = None):
+        return cv2.imdecode(payload, cv2.IMREAD_COLOR)
+
+
+class RawCodec(VideoCodec):
+    """Uncompressed pixels, downscaled far enough to fit in one datagram"""
+
+    def __init__(self, size: tuple = (88, 60)):
+        self.size = size
+
+    def encode(self, frame, quality: int = None):
+        return cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+    def decode(self, payload, size: tuple = None):
+        return payload
+
+
+class TileCodec(VideoCodec):
+    stateful = True
+
+    def __init__(self, **options):
+        self.encoder = TileEncoder(**options)
+        self.decoder = TileDecoder()
+
+    def encode(self, frame, quality: int = None):
+        return self.encoder.encode(frame, jpeg_params(quality or 90))
+
+    def commit(self, payload):
+        self.encoder.commit(payload)
+
+    def decode(self, payload, size: tuple = None):
+        # tiles patch the full-size canvas, so they are always decoded in full
+        return self.decoder.decode(payload)
+
+    def request_keyframe(self):
+        self.encoder.request_keyframe()
+
+    def get_stats(self) -> dict:
+        return self.encoder.get_stats()
+
+
+class PcmCodec(Codec):
+    """Raw paInt16 samples, as captured"""
+
+    media = AUDIO
+
+    def encode(self, data, quality: int = None):
+        return bytes(data)
+
+    def decode(self, payload):
+        return payload
+
+
+class UlawCodec(Codec):
+    """G.711 μ-law, 8 bits per sample (2:1)"""
+
+    media = AUDIO
+
+    def encode(self, data, quality: int = None):
+        return ulaw_encode(np.frombuffer(data, np.int16)).tobytes()
+
+    def decode(self, payload):
+        return ulaw_decode(np.frombuffer(payload, np.uint8)).tobytes()
+
+
+class AdpcmCodec(Codec):
+    """IMA-ADPCM, 4 bits per sample (4:1); each block carries its own state"""
+
+    media = AUDIO
+
+    def __init__(self):
+        self.state = (0, 0)
+
+    def encode(self, data, quality: int = None):
+        payload, self.state = adpcm_encode(np.frombuffer(data, np.int16), self.state)
+        return payload
+
+    def decode(self, payload):
+        return adpcm_decode(payload).tobytes()
+
+
+class ComfortNoiseCodec(Codec):
+    """Sent once when a speaker goes silent instead of the silent blocks.
+
+    The payload is (noise level in dBFS or None, samples per block); the
+    receiver plays noise at that level, or nothing, until speech resumes.
+    """
+
+    media = AUDIO
+
+    def encode(self, data, quality: int = None):
+        return data
+
+    def decode(self, payload):
+        level, n_samples = payload
+        if level is None:
+            return None
+        return comfort_noise(level, n_samples).tobytes()
+
+
+class CodecRegistry:
+    def __init__(self):
+        self.factories = {VIDEO: {}, AUDIO: {}}
+        # what a peer that never announced its codecs is assumed to take
+        self.fallback = {VIDEO: JPEG_CODEC, AUDIO: PCM_CODEC}
+
+    def register(self, media: str, name: str, factory):
+        self.factories[media][name] = factory
+
+    def create(self, media: str, name: str, **options) -> Codec:
+        codec = self.factories[media][name](**options)
+        codec.name = name
+        return codec
+
+    def names(self, media: str) -> list:
+        return list(self.factories[media])
+
+    def capabilities(self) -> dict:
+        return {media: self.names(media) for media in self.factories}
+
+    def negotiate(self, media: str, preferred: list, peer_codecs: list) -> str:
+        """First preferred codec that every peer can decode"""
+        for name in preferred:
+            if name not in self.factories[media]:
+                continue
+            if all(name in codecs for codecs in peer_codecs):
+                return name
+        return self.fallback[media]
+
+
+codec_registry = CodecRegistry()
+codec_registry.register(VIDEO, JPEG_CODEC, JpegCodec)
+for quality in (90, 70, 50):
+    fixed_jpeg = partial(JpegCodec, quality)
+    codec_registry.register(VIDEO, f"{JPEG_CODEC}-q{quality}", fixed_jpeg)
+codec_registry.register(VIDEO, WEBP_CODEC, WebpCodec)
+codec_registry.register(VIDEO, RAW_CODEC, RawCodec)
+codec_registry.register(VIDEO, TILE_CODEC, TileCodec)
+codec_registry.register(AUDIO, PCM_CODEC, PcmCodec)
+codec_registry.register(AUDIO, ULAW_CODEC, UlawCodec)
+codec_registry.register(AUDIO, ADPCM_CODEC, AdpcmCodec)
+codec_registry.register(AUDIO, COMFORT_NOISE_CODEC, ComfortNoiseCodec)
+
+
+def benchmark(media: str, sample, names: list = None, repeat: int = 50) -> dict:
+    """Mean encode/decode time (ms) and payload size for each codec"""
+    results = {}
+    for name in names or codec_registry.names(media):
+        encoder = codec_registry.create(media, name)
+        decoder = codec_registry.create(media, name)
+        encode_time = decode_time = 0.0
+        size = 0
+        for _ in range(repeat):
+            # stateful codecs are measured on full (key) frames
+            encoder.request_keyframe()
+            start = time.perf_counter()
+            payload = encoder.encode(sample, 90)
+            encoder.commit(payload)
+            encode_time += time.perf_counter() - start
+            size = payload_size(payload)
+
+            start = time.perf_counter()
+            decoder.decode(payload)
+            decode_time += time.perf_counter() - start
+        results[name] = {
+            "encode_ms": encode_time / repeat * 1000,
+            "decode_ms": decode_time / repeat * 1000,
+            "bytes": size,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    frame = cv2.resize(cv2.imread("img/nocam.jpeg"), (352, 240))
+    for name, result in benchmark(VIDEO, frame).items():
+        print(f"[{VIDEO}] {name:10} {result}")
+
+    # one 2048-sample block of tones and noise at 48 kHz
+    t = np.arange(2048) / 48000
+    rng = np.random.default_rng(0)
+    block = 6000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 1800 * t)
+    block = (block + rng.normal(0, 300, t.size)).astype(np.int16).tobytes()
+    names = codec_registry.names(AUDIO)
+    names.remove(COMFORT_NOISE_CODEC)
+    for name, result in benchmark(AUDIO, block, names).items():
+        print(f"[{AUDIO}] {name:10} {result}")
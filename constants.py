@@ -19,14 +19,33 @@ GET = 'GET'
 POST = 'POST'
 ADD = 'ADD'
 RM = 'RM'
+KEYFRAME = 'KEYFRAME'  # ask a sender for a full video frame
+SUBSCRIBE = 'SUBSCRIBE'  # senders whose media a client wants, {name: (w, h)}
 
 # data types
 VIDEO = 'Video'
 AUDIO = 'Audio'
 TEXT = 'Text'
 FILE = 'File'
+STATE = 'State'  # camera/microphone on-off, sent on the main connection
+CODECS = 'Codecs'  # codecs a client can decode, sent on the main connection
+CONFIG = 'Config'  # meeting settings, sent by the server to clients joining
+RESOLUTION = 'Resolution'  # largest (w, h) any receiver shows a sender's video at
+REPORT = 'Report'  # receiver report to a video sender: loss and a timestamp echo
+
+# codecs
+JPEG_CODEC = 'jpeg'
+WEBP_CODEC = 'webp'
+RAW_CODEC = 'raw'
+TILE_CODEC = 'tile'
+PCM_CODEC = 'pcm'
+ULAW_CODEC = 'ulaw'
+ADPCM_CODEC = 'adpcm'
+COMFORT_NOISE_CODEC = 'cn'  # start of a silence, see VoiceActivityDetector
 
 MEDIA_SIZE = {VIDEO: 25000, AUDIO: 4500}
+# the pickled Message and MediaPacket around an audio payload (measured ~210)
+AUDIO_PACKET_OVERHEAD = 512
 
 
 def send_bytes(self, msg):
@@ -90,3 +109,68 @@ class Message:
     
     def __getitem__(self, keys):
         return iter(getattr(self, k) for k in keys)
+
+
+@dataclass
+class TileFrame:
+    seq: int
+    size: tuple[int, int]  # (width, height) of the full frame
+    tile_size: int
+    keyframe: bool
+    tiles: list  # row-major indices of the tiles packed into image
+    image: object  # JPEG buffer, the whole frame for keyframes
+
+    @property
+    def nbytes(self):
+        return len(self.image)
+
+
+@dataclass
+class MediaPacket:
+    codec: str  # registered codec name, see codec_core
+    payload: any
+    seq: int = 0  # per sender and media, counts sent packets
+    timestamp: float = 0.0  # sender's capture time (seconds)
+
+
+@dataclass
+class AudioConfig:
+    """Audio framing of a meeting, the same for every client in it.
+
+    Packets must fit in one MEDIA_SIZE[AUDIO] datagram even as PCM, which
+    peers fall back to before codecs are negotiated, so frames_per_packet
+    is clamped to what fits.
+    """
+
+    frame_ms: int = 20  # captured at a time
+    frames_per_packet: int = 2  # aggregated per datagram, trades latency for rate
+    sample_rate: int = 48000
+
+    def __post_init__(self):
+        max_frames = self.max_frames_per_packet
+        if max_frames < 1:
+            raise ValueError(f"{self.frame_ms} ms PCM frames do not fit in a packet")
+        if self.frames_per_packet > max_frames:
+            print(
+                f"[WARNING] {self.frames_per_packet} frames per packet do not fit, "
+                f"sending {max_frames}"
+            )
+            self.frames_per_packet = max_frames
+        self.frames_per_packet = max(1, self.frames_per_packet)
+
+    @property
+    def max_frames_per_packet(self):
+        pcm_frame_bytes = 2 * self.frame_size  # int16 samples
+        return (MEDIA_SIZE[AUDIO] - AUDIO_PACKET_OVERHEAD) // pcm_frame_bytes
+
+    @property
+    def frame_size(self):
+        return self.sample_rate * self.frame_ms // 1000
+
+    @property
+    def packet_size(self):
+        return self.frame_size * self.frames_per_packet
+
+    @property
+    def packet_ms(self):
+        return self.frame_ms * self.frames_per_packet
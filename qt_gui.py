@@ -1,8 +1,37 @@
 import os
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import cv2
+import numpy as np
 import pyaudio
-from PyQt6.QtCore import Qt, QThread, QTimer, QSize, QRunnable, pyqtSlot
-from PyQt6.QtGui import QImage, QPixmap, QActionGroup, QIcon
+from PyQt6.QtCore import (
+    Qt,
+    QAbstractListModel,
+    QModelIndex,
+    QObject,
+    QRect,
+    QThread,
+    QThreadPool,
+    QTimer,
+    QSize,
+    QRunnable,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt6.QtGui import (
+    QImage,
+    QPixmap,
+    QPainter,
+    QActionGroup,
+    QIcon,
+    QColor,
+    QFont,
+    QFontMetrics,
+    QLinearGradient,
+    QPen,
+)
 from PyQt6.QtWidgets import (
     QMainWindow,
     QVBoxLayout,
@@ -13,9 +42,10 @@ from PyQt6.QtWidgets import (
     QWidget,
     QListWidget,
     QListWidgetItem,
+    QListView,
+    QStyledItemDelegate,
     QMessageBox,
     QComboBox,
-    QTextEdit,
     QLineEdit,
     QPushButton,
     QFileDialog,
@@ -27,6 +57,23 @@ from PyQt6.QtWidgets import (
 )
 
 from constants import *
+from video_core import (
+    LatestFrameSlot,
+    CaptureThread,
+    EncodeTimer,
+    BitrateController,
+    ChangeDetector,
+    payload_size,
+    packet_size,
+)
+from codec_core import codec_registry
+from chat_core import ChatMessage, ChatStore
+from audio_core import (
+    VoiceActivityDetector,
+    ActiveSpeakerDetector,
+    AudioRingBuffer,
+    level_db,
+)
 
 # Camera
 CAMERA_RES = "240p"
@@ -43,8 +90,56 @@ FRAME_WIDTH = frame_size[CAMERA_RES][0]
 FRAME_HEIGHT = frame_size[CAMERA_RES][1]
 
 # Image Encoding
-ENABLE_ENCODE = True
-ENCODE_PARAM = [int(cv2.IMWRITE_JPEG_QUALITY), 90]
+MIN_ENCODE_QUALITY = 30
+MAX_ENCODE_QUALITY = 90
+
+# Adaptive bitrate
+TARGET_BITRATE = 450_000  # bytes per second
+# pickled MediaPacket; leave room for the Message fields around it
+VIDEO_PACKET_BUDGET = MEDIA_SIZE[VIDEO] - 1024
+CAMERA_RES_LADDER = [(176, 120)] + [frame_size[r] for r in ("240p", "360p", "480p")]
+
+# Codecs, most preferred first; a sender uses the first one every peer can
+# decode (see codec_core for the registered names)
+VIDEO_CODECS = [JPEG_CODEC, TILE_CODEC]
+AUDIO_CODECS = [ADPCM_CODEC, ULAW_CODEC, PCM_CODEC]
+VIDEO_CODEC_OPTIONS = {
+    TILE_CODEC: {
+        "tile_size": 64,
+        "pixel_threshold": 12,  # a pixel counts as changed above this (0-255)
+        "dirty_area": 0.01,  # fraction of changed pixels that makes a tile dirty
+        "keyframe_interval": 5.0,
+    },
+}
+
+# Rendering, all tiles are drawn from one timer ticking at the display rate
+RENDER_BUDGET_MS = 8  # per tick; tiles left over wait for the next tick
+DECODE_THREADS = os.cpu_count() or 2  # tiles are decoded off the GUI thread
+RESIZE_DEBOUNCE_MS = 16  # window resizes are applied at most once per frame
+PIXMAP_CACHE_SIZE = 32  # placeholder and overlay pixmaps, per tile size
+GRID_PAGE_SIZE = 9  # most tiles per page; video of other pages is not received
+TILE_MARGIN = 7  # around each tile, the QListWidget::item margin
+
+# Speaker view: the active speaker as large as fits above a row of
+# thumbnails, which are subscribed at the lowest camera resolution
+SPEAKER_THUMB_SIZE = CAMERA_RES_LADDER[0]
+SPEAKER_FOCUS_STEP = 64  # focus width is rounded down to a multiple of this
+SPEAKER_UPDATE_MS = 100
+SPEAKER_THRESHOLD_DB = -40.0  # quieter than this (dBFS) is not speaking
+SPEAKER_SWITCH_MARGIN_DB = 6.0  # a new speaker must be this much louder
+SPEAKER_HOLD_TIME = 1.0  # and for this long (seconds) before the focus moves
+
+# Chat, the view keeps a window of messages and pages the rest from a store
+CHAT_MAX_MESSAGES = 500
+CHAT_PAGE_SIZE = 50  # messages loaded when scrolling past either end
+CHAT_HISTORY_PATH = ":memory:"  # sqlite database, a file keeps the history
+
+# Static-scene frame skipping
+ENABLE_FRAME_SKIP = True
+SKIP_MEAN_DIFF = 1.5  # mean absolute difference (0-255) between thumbnails
+SKIP_PIXEL_DIFF = 12  # a thumbnail pixel counts as changed above this
+SKIP_CHANGED_AREA = 0.01  # fraction of changed pixels that forces a send
+REFRESH_INTERVAL = 2.0  # seconds between forced refresh frames
 
 # frame for no camera
 NOCAM_FRAME = cv2.imread("img/nocam.jpeg")
@@ -55,12 +150,35 @@ NOCAM_FRAME = NOCAM_FRAME[y : y + FRAME_HEIGHT, x : x + FRAME_WIDTH]
 # frame for no microphone
 NOMIC_FRAME = cv2.imread("img/nomic.jpeg")
 
-# Audio
+# Audio, framing is replaced by the meeting's AudioConfig sent by the server
 ENABLE_AUDIO = True
-SAMPLE_RATE = 48000
-BLOCK_SIZE = 2048
+DEFAULT_AUDIO_CONFIG = AudioConfig()
+MIXER_LIMIT = 30000  # peak of the mixed block before it is scaled down
+VOLUME_GAINS = {"🔇 Mute": 0.0, "50%": 0.5, "100%": 1.0, "150%": 1.5, "200%": 2.0}
 pa = pyaudio.PyAudio()
 
+# Capture ring buffer; the sender skips ahead when more than
+# CAPTURE_MAX_BACKLOG packets are waiting instead of sending stale audio
+CAPTURE_BUFFER_MS = 500
+CAPTURE_MAX_BACKLOG = 3
+CAPTURE_TIMEOUT = 0.5  # seconds without input before a read gives up
+
+# Voice activity detection: silent blocks are not sent at all
+ENABLE_VAD = True
+VAD_THRESHOLD_DB = -50.0  # a block quieter than this (dBFS) is never speech
+VAD_MARGIN_DB = 9.0  # speech must also be this far above the noise floor
+VAD_ZCR_MAX = 0.35  # zero crossings per sample; hiss crosses more than voice
+VAD_HANGOVER_MS = 300  # keep sending this long after speech stops
+VAD_FLOOR_WINDOW_MS = 1500  # the noise floor is the quietest block this recent
+# while silent, a comfort-noise packet is resent this often in case one is lost
+VAD_SILENCE_REFRESH_MS = 1000
+ENABLE_COMFORT_NOISE = True  # receivers play the sender's noise floor, not silence
+COMFORT_NOISE_MAX_DB = -45.0
+
+# Receiver jitter buffer, the playout delay adapts between these bounds
+JITTER_MIN_DELAY_MS = 20
+JITTER_MAX_DELAY_MS = 400
+
 
 class Worker(QRunnable):
     def __init__(self, fn, *args, **kwargs):
@@ -76,43 +194,185 @@ class Worker(QRunnable):
 
 
 class Microphone:
-    def __init__(self):
-        self.stream = pa.open(
-            rate=SAMPLE_RATE,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=BLOCK_SIZE,
-        )
+    """Captures in PortAudio's callback into a ring buffer the sender drains.
+
+    The callback runs on PortAudio's own thread, so a busy sender thread
+    delays packets but never makes the device drop input.
+    """
+
+    def __init__(self, config: AudioConfig = DEFAULT_AUDIO_CONFIG):
+        self.lock = threading.Lock()  # configure() may reopen the stream
+        self.stream = None
+        self.ring = None
+        self.device_overflows = 0
+        self.encoder = codec_registry.create(AUDIO, PCM_CODEC)
+        self.vad = VoiceActivityDetector(VAD_THRESHOLD_DB, VAD_MARGIN_DB, VAD_ZCR_MAX)
+        self.silent_blocks = 0
+        self.seq = 0
+        self.configure(config)
+
+    def configure(self, config: AudioConfig):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+            self.config = config
+            self.ring = AudioRingBuffer(config.sample_rate * CAPTURE_BUFFER_MS // 1000)
+            self.vad.hangover_blocks = -(-VAD_HANGOVER_MS // config.packet_ms)
+            self.vad.floor_window = -(-VAD_FLOOR_WINDOW_MS // config.packet_ms)
+            self.stream = pa.open(
+                rate=config.sample_rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                frames_per_buffer=config.frame_size,
+                stream_callback=self.on_capture,
+            )
+
+    def on_capture(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.device_overflows += 1
+        self.ring.write(np.frombuffer(in_data, np.int16))
+        return None, pyaudio.paContinue
 
     def get_data(self):
-        return self.stream.read(BLOCK_SIZE)
+        """One packet's worth of frames, or None if capture has stalled"""
+        config = self.config
+        samples = self.ring.read(
+            config.packet_size,
+            timeout=CAPTURE_TIMEOUT,
+            max_backlog=CAPTURE_MAX_BACKLOG * config.packet_size,
+        )
+        return None if samples is None else samples.tobytes()
+
+    def pause(self):
+        with self.lock:
+            if not self.stream.is_stopped():
+                self.stream.stop_stream()
+
+    def resume(self):
+        with self.lock:
+            # what was captured before the pause is stale
+            self.ring.clear()
+            if self.stream.is_stopped():
+                self.stream.start_stream()
+
+    def get_stats(self) -> dict:
+        return {**self.ring.get_stats(), "device_overflows": self.device_overflows}
+
+    def get_packet(self):
+        """Next packet to send, or None while the speaker is silent"""
+        data = self.get_data()
+        if data is None:
+            return None
+        config = self.config
+        # capture time of the first sample, on the same clock as video frames
+        buffered = self.ring.available() + config.packet_size
+        timestamp = time.time() - buffered / config.sample_rate
+        if ENABLE_VAD and not self.vad.process(np.frombuffer(data, np.int16)):
+            silent_ms = self.silent_blocks * config.packet_ms
+            self.silent_blocks += 1
+            if silent_ms % VAD_SILENCE_REFRESH_MS >= config.packet_ms:
+                return None
+            level = None
+            if ENABLE_COMFORT_NOISE:
+                level = min(self.vad.noise_floor, COMFORT_NOISE_MAX_DB)
+            packet = MediaPacket(COMFORT_NOISE_CODEC, (level, config.packet_size))
+        else:
+            self.silent_blocks = 0
+            packet = MediaPacket(self.encoder.name, self.encoder.encode(data))
+        packet.seq, packet.timestamp = self.seq, timestamp
+        self.seq += 1
+        return packet
 
+    def set_codec(self, codec: str):
+        if codec != self.encoder.name:
+            self.encoder = codec_registry.create(AUDIO, codec)
 
-class AudioThread(QThread):
-    def __init__(self, client, parent=None):
+
+class AudioMixer(QThread):
+    """Mixes every remote participant into a single output stream.
+
+    Writing to the stream blocks for one block, so the sound device paces
+    the loop and every participant's jitter buffer is read once per block.
+    Blocks are as long as the packets received, see AudioConfig.
+    """
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.client = client
         self.stream = pa.open(
-            rate=SAMPLE_RATE,
+            rate=DEFAULT_AUDIO_CONFIG.sample_rate,
             channels=1,
             format=pyaudio.paInt16,
             output=True,
-            frames_per_buffer=BLOCK_SIZE,
+            frames_per_buffer=pyaudio.paFramesPerBufferUnspecified,
         )
-        self.connected = True
+        self.block_size = DEFAULT_AUDIO_CONFIG.packet_size
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.gains = {}  # name -> linear gain, 1.0 when unset
+        self.levels = {}  # name -> level (dBFS) of the last mixed block
+        self.running = True
+        self.limited_blocks = 0
 
-    def run(self):
-        # if this is the current client, then don't play audio
-        if self.client.microphone is not None:
+    def add_client(self, client):
+        if client.current_device:
             return
-        while self.connected:
-            self.update_audio()
+        with self.lock:
+            self.clients[client.name] = client
 
-    def update_audio(self):
-        data = self.client.get_audio()
-        if data is not None:
-            self.stream.write(data)
+    def remove_client(self, name: str):
+        with self.lock:
+            self.clients.pop(name, None)
+            self.gains.pop(name, None)
+            self.levels.pop(name, None)
+
+    def set_gain(self, name: str, gain: float):
+        with self.lock:
+            self.gains[name] = gain
+
+    def get_levels(self) -> dict:
+        with self.lock:
+            return dict(self.levels)
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                clients = list(self.clients.values())
+            if not clients:
+                self.msleep(DEFAULT_AUDIO_CONFIG.packet_ms)
+                continue
+            self.stream.write(self.mix(clients))
+
+    def mix(self, clients: list) -> bytes:
+        blocks = {}
+        for client in clients:
+            data = client.get_audio()
+            if data is not None:
+                blocks[client.name] = np.frombuffer(data, np.int16)
+        if blocks:
+            self.block_size = max(len(samples) for samples in blocks.values())
+
+        with self.lock:
+            gains = dict(self.gains)
+        mixed = np.zeros(self.block_size, np.float32)
+        levels = {}
+        for name, samples in blocks.items():
+            levels[name] = level_db(samples)
+            mixed[: len(samples)] += samples * gains.get(name, 1.0)
+        with self.lock:
+            self.levels = levels
+
+        # scale the whole block down rather than clip the peaks
+        peak = np.abs(mixed).max()
+        if peak > MIXER_LIMIT:
+            mixed *= MIXER_LIMIT / peak
+            self.limited_blocks += 1
+        return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+
+    def stop(self):
+        self.running = False
+        self.wait()
+        self.stream.close()
 
 
 class Camera:
@@ -121,28 +381,239 @@ class Camera:
         if not self.cap.isOpened():
             self.cap = cv2.VideoCapture(0)
 
-    def get_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(
-                frame, frame_size[CAMERA_RES], interpolation=cv2.INTER_AREA
-            )
-            if ENABLE_ENCODE:
-                _, frame = cv2.imencode(".jpg", frame, ENCODE_PARAM)
-            return frame
+        # capture runs on its own thread, get_frame only encodes the newest frame
+        self.frame_slot = LatestFrameSlot()
+        self.capture_thread = CaptureThread(self.cap, self.frame_slot)
+        self.capture_thread.start()
+        self.encode_timer = EncodeTimer()
+        self.bitrate_controller = BitrateController(
+            CAMERA_RES_LADDER,
+            TARGET_BITRATE,
+            VIDEO_PACKET_BUDGET,
+            start_index=CAMERA_RES_LADDER.index(frame_size[CAMERA_RES]),
+            min_quality=MIN_ENCODE_QUALITY,
+            max_quality=MAX_ENCODE_QUALITY,
+        )
+        self.change_detector = ChangeDetector(
+            SKIP_MEAN_DIFF, SKIP_PIXEL_DIFF, SKIP_CHANGED_AREA, REFRESH_INTERVAL
+        )
+        self.encoder = self.create_encoder(VIDEO_CODECS[0])
+        self.last_frame = None
+        self.seq = 0
+
+    def create_encoder(self, codec: str):
+        options = VIDEO_CODEC_OPTIONS.get(codec, {})
+        return codec_registry.create(VIDEO, codec, **options)
+
+    def get_frame(self, timeout: float = 0.5):
+        item = self.frame_slot.take(timeout)
+        if item is None:
+            return None
+        _, timestamp, frame = item
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.resize(
+            frame, self.bitrate_controller.resolution, interpolation=cv2.INTER_AREA
+        )
+        self.last_frame = frame
+        if ENABLE_FRAME_SKIP and not self.change_detector.should_send(frame):
+            return None  # static scene
+        # sent as soon as it is encoded
+        packet = self.encode_timer.encode(self.encode, frame, self.encoder, timestamp)
+        return self.on_encoded(packet)
+
+    def on_encoded(self, packet):
+        if packet is not None:
+            self.bitrate_controller.on_frame(payload_size(packet))
+            packet.seq = self.seq
+            self.seq += 1
+        return packet
+
+    def encode(self, frame, encoder, timestamp: float = 0.0):
+        # anything over the packet budget would be truncated on recv, so shrink
+        # it until it fits or drop it
+        controller = self.bitrate_controller
+        while True:
+            payload = encoder.encode(frame, controller.quality)
+            if payload is None:
+                return None
+            packet = MediaPacket(encoder.name, payload, timestamp=timestamp)
+            size = packet_size(packet)
+            if size <= VIDEO_PACKET_BUDGET:
+                break
+            if not controller.on_oversize(size):
+                return None
+            if frame.shape[1::-1] != controller.resolution:
+                frame = cv2.resize(
+                    frame, controller.resolution, interpolation=cv2.INTER_AREA
+                )
+        encoder.commit(payload)
+        return packet
+
+    def on_feedback(self, loss: float, rtt: float):
+        """A receiver's report: fraction of video lost and round-trip time"""
+        self.bitrate_controller.on_feedback(loss, rtt)
+
+    def set_max_resolution(self, size: tuple = None):
+        """Largest (w, h) any receiver displays this camera at, None for any"""
+        self.bitrate_controller.set_max_resolution(size)
+
+    def set_codec(self, codec: str):
+        if codec == self.encoder.name:
+            return
+        self.encoder = self.create_encoder(codec)
+
+    def request_keyframe(self):
+        self.encoder.request_keyframe()
+        self.change_detector.force_next()
+
+    def pause(self):
+        self.capture_thread.pause()
+
+    def resume(self):
+        self.change_detector.force_next()
+        self.capture_thread.resume()
+
+    def get_stats(self):
+        stats = self.capture_thread.get_stats()
+        stats["encode"] = self.encode_timer.get_stats()
+        stats["bitrate"] = self.bitrate_controller.get_stats()
+        stats["change"] = self.change_detector.get_stats()
+        stats["codec"] = {"name": self.encoder.name, **self.encoder.get_stats()}
+        return stats
+
+    def release(self):
+        self.capture_thread.stop()
+        self.capture_thread.join(timeout=1)
+        self.cap.release()
+
+
+def frame_to_qimage(frame) -> QImage:
+    h, w, ch = frame.shape
+    bytes_per_line = ch * w
+    q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+    # own the pixels, the array goes away with the thread that made it
+    return q_img.copy()
+
+
+class PixmapCache:
+    """Small LRU of pre-rendered pixmaps, keyed by (what, tile size, ...)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.pixmaps = OrderedDict()
+
+    def get(self, key, render) -> QPixmap:
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        pixmap = self.pixmaps[key] = render()
+        if len(self.pixmaps) > self.capacity:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+
+pixmap_cache = PixmapCache(PIXMAP_CACHE_SIZE)
+
+
+def paint_nomic_overlay(pixmap: QPixmap) -> QPixmap:
+    """Paint the muted-microphone badge at the bottom center of pixmap"""
+    overlay = pixmap_cache.get(
+        ("nomic",), lambda: QPixmap.fromImage(frame_to_qimage(NOMIC_FRAME))
+    )
+    painter = QPainter(pixmap)
+    x = (pixmap.width() - overlay.width()) // 2
+    painter.drawPixmap(x, pixmap.height() - 50, overlay)
+    painter.end()
+    return pixmap
+
+
+def placeholder_pixmap(size: tuple, microphone_enabled: bool) -> QPixmap:
+    """No-camera tile, rendered once per tile size and microphone state"""
+
+    def render():
+        frame = cv2.resize(NOCAM_FRAME, size, interpolation=cv2.INTER_AREA)
+        pixmap = QPixmap.fromImage(frame_to_qimage(frame))
+        return pixmap if microphone_enabled else paint_nomic_overlay(pixmap)
+
+    return pixmap_cache.get(("nocam", size, microphone_enabled), render)
+
+
+class FrameDecoder(QObject):
+    """Decodes, resizes and converts tile frames to QImages on a thread pool.
+
+    At most one frame per tile is in flight; finished images come back
+    through image_ready, so the GUI thread only turns them into pixmaps.
+    """
+
+    image_ready = pyqtSignal(str, object, object)  # tile name, render key, QImage
+
+    def __init__(self, parent=None, threads: int = DECODE_THREADS):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads)
+        self.in_flight = set()
+        self.image_ready.connect(self.on_image_ready)
+
+    def submit(self, name: str, key, frame, decoder, size: tuple):
+        """False if this tile is still decoding its previous frame"""
+        if name in self.in_flight:
+            return False
+        self.in_flight.add(name)
+        self.pool.start(Worker(self.decode, name, key, frame, decoder, size))
+        return True
+
+    def decode(self, name: str, key, frame, decoder, size: tuple):
+        image = None
+        try:
+            if decoder is not None:
+                # decoders may decode straight to (close to) the tile size
+                frame = decoder.decode(frame.payload, size)
+            if frame is not None:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                image = frame_to_qimage(frame)
+        except Exception as e:
+            print(f"[{name}] [ERROR] decode failed: {e}")
+        self.image_ready.emit(name, key, image)
+
+    def on_image_ready(self, name: str, key, image):
+        self.in_flight.discard(name)
+
+
+@lru_cache(maxsize=None)
+def name_label_style(font_size: int) -> str:
+    """Stylesheet of a tile's name label, shared by all tiles of a font size"""
+    return f"""
+        QLabel {{
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                stop:0 #6366f1, stop:1 #a5b4fc);
+            color: #fff;
+            font-weight: 700;
+            font-size: {font_size}px;
+            font-family: 'Segoe UI', Arial, sans-serif;
+            border-radius: 8px;
+            padding: {max(4, font_size//3)}px {max(8, font_size//2)}px;
+            margin: 4px;
+            border: 1px solid #4c63d2;
+        }}
+    """
 
 
 class VideoWidget(QWidget):
-    def __init__(self, client, parent=None):
+    def __init__(self, client, frame_decoder: FrameDecoder, parent=None):
         super().__init__(parent)
         self.client = client
+        self.frame_decoder = frame_decoder
         self.parent_window = parent
+        self.tile_size = (FRAME_WIDTH, FRAME_HEIGHT)
         self.init_ui()
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_video)
-        self.init_video()
+        # what is on screen: (frame seq or None, size), the decoded image
+        # and the microphone state the muted badge was drawn for
+        self.render_key = None
+        self.image = None
+        self.shown_microphone = None
+        self.label_font_size = None
 
     def init_ui(self):
         # Modern styling without unsupported properties
@@ -207,61 +678,163 @@ class VideoWidget(QWidget):
         self.layout.addWidget(self.name_label)
         self.setLayout(self.layout)
 
-    def init_video(self):
-        self.timer.start(30)
-
     def update_video(self):
+        """Called by the RenderScheduler of the list holding this tile"""
+        # only decode when the frame or the tile size changed
         frame = self.client.get_video()
-        if frame is None:
-            frame = NOCAM_FRAME.copy()
-        elif ENABLE_ENCODE:
-            frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
-
-        frame = cv2.resize(
-            frame, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv2.INTER_AREA
-        )
+        size = self.tile_size
+        seq = self.client.video_seq if frame is not None else None
+        key = (seq, size)
+        if key == self.render_key:
+            if self.shown_microphone != self.client.microphone_enabled:
+                self.show_image()  # only the badge changed
+            return
 
-        if self.client.audio_data is None:
-            # replace bottom center part of the frame with nomic frame
-            nomic_h, nomic_w, _ = NOMIC_FRAME.shape
-            x, y = FRAME_WIDTH // 2 - nomic_w // 2, FRAME_HEIGHT - 50
-            frame[y : y + nomic_h, x : x + nomic_w] = NOMIC_FRAME.copy()
+        if frame is None:
+            self.render_key = key
+            self.image = None
+            self.show_image()
+            return
+        decoder = None
+        if isinstance(frame, MediaPacket):
+            # stateless codecs are only decoded for frames that get shown
+            decoder = self.client.get_decoder(VIDEO, frame.codec)
+        # if the tile is still busy, the key stays stale and the next tick retries
+        if self.frame_decoder.submit(self.client.name, key, frame, decoder, size):
+            self.render_key = key
+
+    def set_image(self, key, image):
+        if key != self.render_key:
+            return
+        self.image = image
+        self.show_image()
 
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        self.video_viewer.setPixmap(QPixmap.fromImage(q_img))
+    def show_image(self):
+        microphone_enabled = self.shown_microphone = self.client.microphone_enabled
+        if self.image is None:
+            pixmap = placeholder_pixmap(self.render_key[1], microphone_enabled)
+        else:
+            pixmap = QPixmap.fromImage(self.image)
+            if not microphone_enabled:
+                pixmap = paint_nomic_overlay(pixmap)
+        self.video_viewer.setPixmap(pixmap)
 
     def resizeEvent(self, event):
         """Handle dynamic resizing of video widget elements"""
         super().resizeEvent(event)
-        size = event.size()
 
         # Adjust font size based on widget size
-        base_font_size = max(10, min(16, size.width() // 25))
-        self.name_label.setStyleSheet(
-            f"""
-            QLabel {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-                font-weight: 700;
-                font-size: {base_font_size}px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                border-radius: 8px;
-                padding: {max(4, base_font_size//3)}px {max(8, base_font_size//2)}px;
-                margin: 4px;
-                border: 1px solid #4c63d2;
-            }}
-        """
+        font_size = max(10, min(16, event.size().width() // 25))
+        if font_size != self.label_font_size:
+            self.label_font_size = font_size
+            self.name_label.setStyleSheet(name_label_style(font_size))
+
+
+class RenderScheduler(QObject):
+    """Renders every video tile from one timer at the display refresh rate.
+
+    Each tick, visible tiles are updated active speaker first, then the
+    ones that have waited longest, until the time budget is spent; the
+    rest are deferred and come first on the next tick.
+    """
+
+    def __init__(self, list_widget, budget_ms: float = RENDER_BUDGET_MS):
+        super().__init__(list_widget)
+        self.list_widget = list_widget
+        self.budget = budget_ms / 1000
+        self.tiles = {}  # name -> (list item, VideoWidget)
+        self.last_render = {}
+        self.active_speaker = None
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+        self.ticks = 0
+        self.rendered = 0
+        self.deferred = 0
+        self.over_budget = 0
+
+    def start(self):
+        screen = self.list_widget.screen()
+        refresh_rate = (screen.refreshRate() if screen is not None else 0) or 60
+        self.timer.start(max(1, round(1000 / refresh_rate)))
+
+    def add_tile(self, name: str, item, widget):
+        self.tiles[name] = (item, widget)
+
+    def remove_tile(self, name: str):
+        self.tiles.pop(name, None)
+        self.last_render.pop(name, None)
+
+    def set_active_speaker(self, name: str):
+        self.active_speaker = name
+
+    def is_visible(self, item) -> bool:
+        viewport = self.list_widget.viewport().rect()
+        return self.list_widget.visualItemRect(item).intersects(viewport)
+
+    def tick(self):
+        start = time.perf_counter()
+        self.ticks += 1
+        queue = sorted(
+            (name != self.active_speaker, self.last_render.get(name, 0.0), name)
+            for name, (item, _) in self.tiles.items()
+            if self.is_visible(item)
         )
+        for i, (_, _, name) in enumerate(queue):
+            if time.perf_counter() - start > self.budget:
+                self.deferred += len(queue) - i
+                self.over_budget += 1
+                break
+            self.tiles[name][1].update_video()
+            self.last_render[name] = time.perf_counter()
+            self.rendered += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "rendered": self.rendered,
+            "deferred": self.deferred,
+            "over_budget_ticks": self.over_budget,
+        }
 
 
 class VideoListWidget(QListWidget):
-    def __init__(self, parent=None):
+    """Video tiles, one page of participants at a time.
+
+    Only participants on the current page have a VideoWidget; the rest are
+    kept in self.clients and their video is unsubscribed at the server.
+    A page holds as many tiles as fit in the viewport, up to max_page_size.
+    Remote participants in view are subscribed at their tile's pixel size.
+    In speaker view the focus (active speaker) is shown large on every
+    page and the page holds thumbnails of everyone else.
+    """
+
+    subscriptions_changed = pyqtSignal(dict)  # remote name -> tile (w, h)
+
+    def __init__(self, parent=None, max_page_size: int = GRID_PAGE_SIZE):
         super().__init__(parent)
+        self.clients = {}  # name -> client, in display order
+        self.page = 0
+        self.max_page_size = max_page_size
+        self.page_size = max_page_size  # until the viewport is sized
+        self.subscriptions = None
+        self.speaker_view = False
+        self.focus = None  # name of the large tile in speaker view
         self.all_items = {}
+        self.frame_decoder = FrameDecoder(self)
+        self.frame_decoder.image_ready.connect(self.set_image)
+        self.render_scheduler = RenderScheduler(self)
         self.init_ui()
+        self.render_scheduler.start()
+        self.verticalScrollBar().valueChanged.connect(
+            lambda: self.update_subscriptions()
+        )
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.apply_resize)
 
     def init_ui(self):
         self.setFlow(QListWidget.Flow.LeftToRight)
@@ -269,7 +842,6 @@ class VideoListWidget(QListWidget):
         self.setResizeMode(QListWidget.ResizeMode.Adjust)
         self.setMovement(QListWidget.Movement.Static)
 
-        # Clean gradient background
         self.setStyleSheet(
             """
             QListWidget {
@@ -292,20 +864,172 @@ class VideoListWidget(QListWidget):
         )
 
     def add_client(self, client):
-        video_widget = VideoWidget(client)
+        if client.current_device:
+            self.clients = {client.name: client, **self.clients}
+        else:
+            self.clients[client.name] = client
+        self.show_page()
+
+    def remove_client(self, name: str):
+        self.clients.pop(name, None)
+        if self.focus == name:
+            self.focus = None
+        self.show_page()
+
+    def set_speaker_view(self, enabled: bool):
+        self.speaker_view = enabled
+        self.fit_page_size()
+        self.show_page()
+
+    def set_active_speaker(self, name: str):
+        self.render_scheduler.set_active_speaker(name)
+        if name in self.clients and name != self.focus:
+            self.focus = name
+            if self.speaker_view:
+                self.show_page()
+
+    def focus_name(self) -> str:
+        if self.focus in self.clients:
+            return self.focus
+        # nobody has spoken yet, focus the first remote participant
+        for name, client in self.clients.items():
+            if not client.current_device:
+                return name
+        return next(iter(self.clients), None)
+
+    def page_names(self) -> list:
+        names = list(self.clients)
+        if self.speaker_view:
+            focus = self.focus_name()
+            if focus is not None:
+                names.remove(focus)
+        start = self.page * self.page_size
+        return names[start : start + self.page_size]
+
+    def page_count(self) -> int:
+        n = len(self.clients) - (1 if self.speaker_view and self.clients else 0)
+        return max(1, -(-n // self.page_size))
+
+    def next_page(self):
+        self.page = (self.page + 1) % self.page_count()
+        self.show_page()
+
+    def previous_page(self):
+        self.page = (self.page - 1) % self.page_count()
+        self.show_page()
+
+    def show_page(self):
+        self.page = min(self.page, self.page_count() - 1)
+        names = self.page_names()
+        focus = self.focus_name() if self.speaker_view else None
+        if focus is not None:
+            names.insert(0, focus)
+        first = self.item(0) if self.count() else None
+        for name, item in list(self.all_items.items()):
+            # a tile that moves in or out of focus is rebuilt at its new row
+            moved = focus is not None and (name == focus) != (item is first)
+            if name not in names or moved:
+                self.remove_tile(name)
+        for row, name in enumerate(names):
+            if name not in self.all_items:
+                self.add_tile(self.clients[name], row)
+        self.resize_widgets()
+        self.layout_tiles()
+
+    def tile_size(self, name: str) -> tuple:
+        if not self.speaker_view:
+            return FRAME_WIDTH, FRAME_HEIGHT
+        if name == self.focus_name():
+            return self.focus_size()
+        return SPEAKER_THUMB_SIZE
+
+    def grid_capacity(self, size: tuple) -> int:
+        """How many tiles of size fit in the viewport without scrolling"""
+        columns = self.viewport().width() // (size[0] + 2 * TILE_MARGIN)
+        rows = self.viewport().height() // (size[1] + 2 * TILE_MARGIN)
+        return columns * rows
+
+    def fit_page_size(self) -> bool:
+        """Size pages to the tiles that fit in view, True if that changed"""
+        if self.speaker_view:
+            # thumbnails only, in the rows below the focus
+            width, height = SPEAKER_THUMB_SIZE
+            columns = self.viewport().width() // (width + 2 * TILE_MARGIN)
+            rows = (self.viewport().height() - self.focus_size()[1]) // (
+                height + 2 * TILE_MARGIN
+            )
+            capacity = columns * max(1, rows)
+        else:
+            capacity = self.grid_capacity(min(frame_size.values()))
+        page_size = max(1, min(self.max_page_size, capacity))
+        if page_size == self.page_size:
+            return False
+        self.page_size = page_size
+        return True
+
+    def focus_size(self) -> tuple:
+        """Largest 3:2 tile that fits in the viewport above a row of thumbnails"""
+        height = self.viewport().height() - SPEAKER_THUMB_SIZE[1]
+        width = min(self.viewport().width(), height * 3 // 2)
+        width -= width % SPEAKER_FOCUS_STEP
+        width = max(SPEAKER_THUMB_SIZE[0], width)
+        return width, width * 2 // 3
+
+    def layout_tiles(self):
+        for name, item in self.all_items.items():
+            size = self.tile_size(name)
+            widget = self.render_scheduler.tiles[name][1]
+            if widget.tile_size != size:
+                widget.tile_size = size
+                item.setSizeHint(QSize(*size))
+        # place the items now, subscriptions depend on which are in view
+        self.doItemsLayout()
+        self.update_subscriptions()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # lay out and resubscribe at most once per frame while dragging
+        if not self.resize_timer.isActive():
+            self.resize_timer.start()
+
+    def apply_resize(self):
+        if self.fit_page_size():
+            self.show_page()
+        elif self.speaker_view:
+            self.layout_tiles()
+        else:
+            self.update_subscriptions()
+
+    def update_subscriptions(self):
+        subscriptions = {
+            name: self.tile_size(name)
+            for name, item in self.all_items.items()
+            if not self.clients[name].current_device
+            and self.render_scheduler.is_visible(item)
+        }
+        if subscriptions != self.subscriptions:
+            self.subscriptions = subscriptions
+            self.subscriptions_changed.emit(subscriptions)
+
+    def add_tile(self, client, row: int):
+        video_widget = VideoWidget(client, self.frame_decoder)
+        video_widget.tile_size = self.tile_size(client.name)
 
         item = QListWidgetItem()
         item.setFlags(
             item.flags() & ~(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
         )
-        if client.current_device:
-            self.insertItem(0, item)
-        else:
-            self.addItem(item)
-        item.setSizeHint(QSize(FRAME_WIDTH, FRAME_HEIGHT))
+        self.insertItem(row, item)
+        item.setSizeHint(QSize(*video_widget.tile_size))
         self.setItemWidget(item, video_widget)
         self.all_items[client.name] = item
-        self.resize_widgets()
+        self.render_scheduler.add_tile(client.name, item, video_widget)
+
+    def remove_tile(self, name: str):
+        self.render_scheduler.remove_tile(name)
+        item = self.all_items.pop(name)
+        self.removeItemWidget(item)
+        self.takeItem(self.row(item))
 
     def resize_widgets(self, res: str = None):
         global FRAME_WIDTH, FRAME_HEIGHT, LAYOUT_RES
@@ -319,6 +1043,10 @@ class VideoListWidget(QListWidget):
                 res = "360p"
             else:
                 res = "240p"
+            # a smaller resolution if the page does not fit in view at this one
+            resolutions = list(frame_size)
+            while res != resolutions[0] and self.grid_capacity(frame_size[res]) < n:
+                res = resolutions[resolutions.index(res) - 1]
         new_size = frame_size[res]
 
         if new_size == (FRAME_WIDTH, FRAME_HEIGHT):
@@ -326,20 +1054,222 @@ class VideoListWidget(QListWidget):
         else:
             FRAME_WIDTH, FRAME_HEIGHT = new_size
             LAYOUT_RES = res
+        self.layout_tiles()
 
-        for i in range(n):
-            self.item(i).setSizeHint(QSize(FRAME_WIDTH, FRAME_HEIGHT))
+    def set_image(self, name: str, key, image):
+        tile = self.render_scheduler.tiles.get(name)
+        if tile is not None:
+            tile[1].set_image(key, image)
 
-    def remove_client(self, name: str):
-        self.takeItem(self.row(self.all_items[name]))
-        self.all_items.pop(name)
-        self.resize_widgets()
+
+class ChatModel(QAbstractListModel):
+    """A window of at most max_messages consecutive messages from the store.
+
+    New messages are only added while the window reaches the latest one;
+    scrolling loads pages from the store and drops rows from the other end.
+    """
+
+    def __init__(
+        self,
+        store: ChatStore,
+        max_messages: int = CHAT_MAX_MESSAGES,
+        page_size: int = CHAT_PAGE_SIZE,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.store = store
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.messages = []
+        self.at_end = True  # the last row is the latest message
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        msg = self.messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return msg.text
+        if role == Qt.ItemDataRole.UserRole:
+            return msg
+        return None
+
+    def append(self, msg: ChatMessage) -> bool:
+        """Store msg; True if it was added to the window"""
+        self.store.add(msg)
+        if not self.at_end:
+            return False
+        self.insert(len(self.messages), [msg])
+        self.trim_head()
+        return True
+
+    def load_older(self) -> int:
+        if not self.messages:
+            return 0
+        older = self.store.before(self.messages[0].id, self.page_size)
+        self.insert(0, older)
+        self.trim_tail()
+        return len(older)
+
+    def load_newer(self) -> int:
+        if self.at_end:
+            return 0
+        newer = self.store.after(self.messages[-1].id, self.page_size)
+        self.insert(len(self.messages), newer)
+        self.at_end = len(newer) < self.page_size
+        self.trim_head()
+        return len(newer)
+
+    def show_latest(self):
+        if self.at_end:
+            return
+        self.beginResetModel()
+        self.messages = self.store.before(2**63 - 1, self.page_size)
+        self.at_end = True
+        self.endResetModel()
+
+    def insert(self, row: int, messages: list):
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(messages) - 1)
+        self.messages[row:row] = messages
+        self.endInsertRows()
+
+    def trim_head(self):
+        extra = len(self.messages) - self.max_messages
+        if extra > 0:
+            self.beginRemoveRows(QModelIndex(), 0, extra - 1)
+            del self.messages[:extra]
+            self.endRemoveRows()
+
+    def trim_tail(self):
+        extra = len(self.messages) - self.max_messages
+        if extra > 0:
+            n = len(self.messages)
+            self.beginRemoveRows(QModelIndex(), n - extra, n - 1)
+            del self.messages[n - extra :]
+            self.endRemoveRows()
+            self.at_end = False
+
+
+class ChatDelegate(QStyledItemDelegate):
+    """Paints one chat bubble; only rows in view are ever painted.
+
+    Row heights depend on the wrapped text, so they are cached per
+    message and view width.
+    """
+
+    MARGIN = 60  # on the side away from the sender
+    PADDING = (24, 14)
+    SPACING = 7
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.header_font = QFont("Segoe UI")
+        self.header_font.setPixelSize(14)
+        self.header_font.setBold(True)
+        self.time_font = QFont("Segoe UI")
+        self.time_font.setPixelSize(12)
+        self.text_font = QFont("Segoe UI")
+        self.text_font.setPixelSize(16)
+        self.width = None
+        self.sizes = {}  # message id -> QSize at self.width
+
+    def text_rect(self, msg: ChatMessage, width: int) -> QRect:
+        bubble_width = max(1, width - self.MARGIN - 2 * self.PADDING[0])
+        return QFontMetrics(self.text_font).boundingRect(
+            QRect(0, 0, bubble_width, 1_000_000),
+            Qt.TextFlag.TextWordWrap,
+            msg.text,
+        )
+
+    def sizeHint(self, option, index) -> QSize:
+        width = self.view.viewport().width()
+        if width != self.width:
+            self.width = width
+            self.sizes.clear()
+        msg = index.data(Qt.ItemDataRole.UserRole)
+        size = self.sizes.get(msg.id)
+        if size is None:
+            height = (
+                QFontMetrics(self.header_font).height()
+                + self.SPACING
+                + self.text_rect(msg, width).height()
+                + 2 * self.PADDING[1]
+                + 2 * self.SPACING
+            )
+            size = self.sizes[msg.id] = QSize(width, height)
+        return size
+
+    def paint(self, painter, option, index):
+        msg = index.data(Qt.ItemDataRole.UserRole)
+        own = msg.from_name == "You"
+        rect = option.rect.adjusted(0, self.SPACING, 0, -self.SPACING)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # header: sender, recipients and time, on the sender's side
+        stamp = time.strftime("  %H:%M", time.localtime(msg.timestamp))
+        parts = [
+            (msg.from_name, self.header_font, "#6366f1" if own else "#334155"),
+            (f"  to {msg.to_name}", self.time_font, "#64748b"),
+            (stamp, self.time_font, "#6366f1"),
+        ]
+        header_height = QFontMetrics(self.header_font).height()
+        widths = [QFontMetrics(font).horizontalAdvance(text) for text, font, _ in parts]
+        x = rect.right() - sum(widths) if own else rect.left()
+        for (text, font, color), width in zip(parts, widths):
+            painter.setFont(font)
+            painter.setPen(QColor(color))
+            painter.drawText(
+                QRect(x, rect.top(), width, header_height),
+                Qt.AlignmentFlag.AlignVCenter,
+                text,
+            )
+            x += width
+
+        text_rect = self.text_rect(msg, rect.width())
+        bubble = QRect(
+            0,
+            rect.top() + header_height + self.SPACING,
+            text_rect.width() + 2 * self.PADDING[0],
+            text_rect.height() + 2 * self.PADDING[1],
+        )
+        if own:
+            bubble.moveRight(rect.right())
+            gradient = QLinearGradient(bubble.left(), 0, bubble.right(), 0)
+            gradient.setColorAt(0, QColor("#6366f1"))
+            gradient.setColorAt(1, QColor("#a5b4fc"))
+            painter.setPen(Qt.PenStyle.NoPen)
+            text_color = QColor("#ffffff")
+        else:
+            bubble.moveLeft(rect.left())
+            gradient = QLinearGradient(bubble.left(), 0, bubble.right(), 0)
+            gradient.setColorAt(0, QColor("#f8fafc"))
+            gradient.setColorAt(1, QColor("#e2e8f0"))
+            painter.setPen(QPen(QColor("#a5b4fc"), 2))
+            text_color = QColor("#334155")
+        painter.setBrush(gradient)
+        painter.drawRoundedRect(bubble, 22, 22)
+
+        painter.setFont(self.text_font)
+        painter.setPen(text_color)
+        painter.drawText(
+            bubble.adjusted(*self.PADDING, -self.PADDING[0], -self.PADDING[1]),
+            Qt.TextFlag.TextWordWrap,
+            msg.text,
+        )
+        painter.restore()
 
 
 class ChatWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_window = parent
+        self.chat_store = ChatStore(CHAT_HISTORY_PATH)
         self.init_ui()
 
     def init_ui(self):
@@ -380,11 +1310,23 @@ class ChatWidget(QWidget):
         )
         self.layout.addWidget(self.title_label)
 
-        self.central_widget = QTextEdit(self)
-        self.central_widget.setReadOnly(True)
+        self.chat_model = ChatModel(self.chat_store, parent=self)
+        self.central_widget = QListView(self)
+        self.central_widget.setModel(self.chat_model)
+        self.central_widget.setItemDelegate(ChatDelegate(self.central_widget))
+        self.central_widget.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.central_widget.setVerticalScrollMode(
+            QListView.ScrollMode.ScrollPerPixel
+        )
+        # rows are laid out a batch at a time rather than all up front
+        self.central_widget.setLayoutMode(QListView.LayoutMode.Batched)
+        self.central_widget.setBatchSize(CHAT_PAGE_SIZE)
+        self.central_widget.verticalScrollBar().valueChanged.connect(
+            self.on_chat_scrolled
+        )
         self.central_widget.setStyleSheet(
             """
-            QTextEdit {
+            QListView {
                 background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
                     stop:0 #ffffff, stop:1 #f8fafc);
                 border: 2px solid #e0e7ff;
@@ -396,7 +1338,7 @@ class ChatWidget(QWidget):
                 selection-background-color: #a5b4fc;
                 min-height: 180px;
             }
-            QTextEdit:focus {
+            QListView:focus {
                 border: 2px solid #6366f1;
                 background: #fff;
             }
@@ -437,6 +1379,7 @@ class ChatWidget(QWidget):
         self.select_all_checkbox, _ = self.add_client("")
         self.clients_menu.addSeparator()
 
+        # Modern styled buttons with dynamic sizing
         self.clients_button = QPushButton("👥 Select Recipients", self)
         self.clients_button.setMenu(self.clients_menu)
         self.clients_button.setStyleSheet(
@@ -548,10 +1491,12 @@ class ChatWidget(QWidget):
 
         self.layout.addSpacing(20)
 
+        # Button container for Leave and End call buttons
         self.button_container = QHBoxLayout()
         self.button_container.setSpacing(12)
         self.layout.addLayout(self.button_container)
 
+        # Leave meeting button
         self.leave_button = QPushButton("🚪 Leave Meeting", self)
         self.leave_button.setStyleSheet(
             """
@@ -662,43 +1607,27 @@ class ChatWidget(QWidget):
         return text
 
     def add_msg(self, from_name: str, to_name: str, msg: str):
-        timestamp = __import__("datetime").datetime.now().strftime("%H:%M")
-
+        scrollbar = self.central_widget.verticalScrollBar()
+        following = scrollbar.value() == scrollbar.maximum()
         if from_name == "You":
-            bubble_style = """
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: white;
-                margin-left: 60px;
-                text-align: right;
-            """
-            sender_style = "color: #6366f1; text-align: right; margin-left: 60px;"
-        else:
-            bubble_style = """
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #f8fafc, stop:1 #e2e8f0);
-                color: #334155;
-                margin-right: 60px;
-                border: 2px solid #a5b4fc;
-            """
-            sender_style = "color: #334155; margin-right: 60px;"
-
-        html = f"""
-        <div style="margin-bottom: 22px; font-family: 'Segoe UI', Arial, sans-serif;">
-            <div style="{sender_style} font-weight: 700; font-size: 15px; margin-bottom: 7px;">
-                {from_name} <span style="color: #64748b; font-weight: 400;">to {to_name}</span>
-                <span style="color: #6366f1; font-size: 12px; margin-left: 12px;">{timestamp}</span>
-            </div>
-            <div style="{bubble_style} padding: 18px 24px; border-radius: 22px; 
-                        display: inline-block; max-width: 80%; word-wrap: break-word;
-                        font-size: 16px; line-height: 1.5;">
-                {msg}
-            </div>
-        </div>
-        """
-        self.central_widget.append(html)
+            # sending jumps back to the latest messages
+            self.chat_model.show_latest()
+            following = True
+        added = self.chat_model.append(ChatMessage(from_name, to_name, msg))
+        if added and following:
+            self.central_widget.scrollToBottom()
+
+    def on_chat_scrolled(self, value: int):
         scrollbar = self.central_widget.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        if value == scrollbar.minimum():
+            loaded = self.chat_model.load_older()
+            if loaded:
+                # keep the message that was at the top in place
+                self.central_widget.scrollTo(
+                    self.chat_model.index(loaded), QListView.ScrollHint.PositionAtTop
+                )
+        elif value == scrollbar.maximum():
+            self.chat_model.load_newer()
 
 
 class LoginDialog(QDialog):
@@ -710,6 +1639,7 @@ class LoginDialog(QDialog):
         self.setWindowTitle("🎥 Video Conference - Join Now")
         self.setFixedSize(420, 240)
 
+        # Clean modern styling
         self.setStyleSheet(
             """
             QDialog {
@@ -804,12 +1734,67 @@ class LoginDialog(QDialog):
         self.reject()
 
 
+@lru_cache(maxsize=None)
+def main_window_style(menu_font_size: int) -> str:
+    return f"""
+        QMainWindow {{
+            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                stop:0 #6366f1, stop:1 #a5b4fc);
+        }}
+        QMenuBar {{
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                stop:0 #4c63d2, stop:1 #6366f1);
+            color: white;
+            font-size: {menu_font_size}px;
+            font-weight: 700;
+            padding: {max(6, menu_font_size//2)}px;
+            border-radius: 6px;
+            font-family: 'Segoe UI', Arial, sans-serif;
+        }}
+        QMenuBar::item {{
+            background-color: transparent;
+            padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
+            border-radius: 6px;
+            margin: 2px;
+        }}
+        QMenuBar::item:selected {{
+            background-color: rgba(255, 255, 255, 0.2);
+        }}
+        QMenu {{
+            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                stop:0 #ffffff, stop:1 #f8fafc);
+            border: 2px solid #a5b4fc;
+            border-radius: 12px;
+            padding: 8px;
+            font-size: {max(11, menu_font_size-2)}px;
+        }}
+        QMenu::item {{
+            padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
+            border-radius: 8px;
+            margin: 2px;
+        }}
+        QMenu::item:selected {{
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                stop:0 #6366f1, stop:1 #a5b4fc);
+            color: #fff;
+        }}
+    """
+
+
 class MainWindow(QMainWindow):
     def __init__(self, client, server_conn):
         super().__init__()
         self.client = client
         self.server_conn = server_conn
-        self.audio_threads = {}
+        self.audio_mixer = AudioMixer(self) if ENABLE_AUDIO else None
+        self.speaker_detector = ActiveSpeakerDetector(
+            SPEAKER_THRESHOLD_DB, SPEAKER_SWITCH_MARGIN_DB, SPEAKER_HOLD_TIME
+        )
+        self.menu_font_size = None
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.apply_resize)
 
         self.server_conn.add_client_signal.connect(self.add_client)
         self.server_conn.remove_client_signal.connect(self.remove_client)
@@ -821,6 +1806,8 @@ class MainWindow(QMainWindow):
 
         self.server_conn.name = self.login_dialog.get_name()
         self.server_conn.start()
+        if self.audio_mixer is not None:
+            self.audio_mixer.start()
         self.init_ui()
 
     def init_ui(self):
@@ -884,7 +1871,6 @@ class MainWindow(QMainWindow):
         self.video_list_widget = VideoListWidget()
         self.setCentralWidget(self.video_list_widget)
 
-        # Enhanced sidebar styling with dynamic sizing
         self.sidebar = QDockWidget("💬 Chat", self)
         self.sidebar.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
         self.sidebar.setMinimumWidth(300)
@@ -894,20 +1880,22 @@ class MainWindow(QMainWindow):
         self.sidebar.setWidget(self.chat_widget)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.sidebar)
 
-        # Connect buttons
         self.chat_widget.send_button.clicked.connect(lambda: self.send_msg(TEXT))
         self.chat_widget.line_edit.returnPressed.connect(lambda: self.send_msg(TEXT))
         self.chat_widget.file_button.clicked.connect(lambda: self.send_msg(FILE))
         self.chat_widget.leave_button.clicked.connect(self.leave_meeting)
         self.chat_widget.end_button.clicked.connect(self.close)
 
-        # menus for camera and microphone toggle
         self.camera_menu = self.menuBar().addMenu("📹 Camera")
         self.microphone_menu = self.menuBar().addMenu("🎤 Microphone")
         self.layout_menu = self.menuBar().addMenu("📐 Layout")
+        self.volume_menu = self.menuBar().addMenu("🔊 Volume")
+        self.stats_menu = self.menuBar().addMenu("📊 Stats")
+        self.volume_menus = {}  # remote name -> its gain submenu
 
         self.camera_menu.addAction("📹 Disable Camera", self.toggle_camera)
         self.microphone_menu.addAction("🎤 Disable Microphone", self.toggle_microphone)
+        self.stats_menu.addAction("📊 Call Stats", self.show_stats)
 
         self.layout_actions = {}
         layout_action_group = QActionGroup(self)
@@ -922,27 +1910,97 @@ class MainWindow(QMainWindow):
             self.layout_menu.addAction(layout_action)
             self.layout_actions[res] = layout_action
 
+        self.layout_menu.addSeparator()
+        speaker_view_action = self.layout_menu.addAction("🗣 Speaker View")
+        speaker_view_action.setCheckable(True)
+        speaker_view_action.toggled.connect(self.video_list_widget.set_speaker_view)
+        self.layout_menu.addAction(
+            "◀ Previous Page", self.video_list_widget.previous_page
+        )
+        self.layout_menu.addAction("▶ Next Page", self.video_list_widget.next_page)
+        self.video_list_widget.subscriptions_changed.connect(
+            self.update_video_subscriptions
+        )
+
+        self.speaker_timer = QTimer(self)
+        self.speaker_timer.timeout.connect(self.update_active_speaker)
+        if self.audio_mixer is not None:
+            self.speaker_timer.start(SPEAKER_UPDATE_MS)
+
     def add_client(self, client):
         self.video_list_widget.add_client(client)
         self.layout_actions[LAYOUT_RES].setChecked(True)
-        if ENABLE_AUDIO:
-            self.audio_threads[client.name] = AudioThread(client, self)
-            self.audio_threads[client.name].start()
+        if self.audio_mixer is not None:
+            self.audio_mixer.add_client(client)
+            if not client.current_device:
+                self.add_volume_menu(client.name)
         if not client.current_device:
             self.chat_widget.add_client(client.name)
 
     def remove_client(self, name: str):
         self.video_list_widget.remove_client(name)
         self.layout_actions[LAYOUT_RES].setChecked(True)
-        if ENABLE_AUDIO:
-            self.audio_threads[name].connected = False
-            self.audio_threads[name].wait()
-            self.audio_threads.pop(name)
-            print(f"Audio Thread for {name} terminated")
+        if self.audio_mixer is not None:
+            self.audio_mixer.remove_client(name)
+        menu = self.volume_menus.pop(name, None)
+        if menu is not None:
+            self.volume_menu.removeAction(menu.menuAction())
+        self.speaker_detector.remove(name)
         print(f"removing {name} chat...")
         self.chat_widget.remove_client(name)
         print(f"{name} removed")
 
+    def add_volume_menu(self, name: str):
+        """Gain of one participant in the mix"""
+        menu = self.volume_menu.addMenu(f"🔊 {name}")
+        gain_action_group = QActionGroup(menu)
+        for label, gain in VOLUME_GAINS.items():
+            gain_action = gain_action_group.addAction(label)
+            gain_action.setCheckable(True)
+            gain_action.setChecked(gain == 1.0)
+            gain_action.triggered.connect(
+                lambda checked, gain=gain: self.audio_mixer.set_gain(name, gain)
+            )
+            menu.addAction(gain_action)
+        self.volume_menus[name] = menu
+
+    def show_stats(self):
+        """Receive stats of every remote participant, A/V offset first"""
+
+        def ms(value):
+            return "n/a" if value is None else f"{value:.0f} ms"
+
+        lines = []
+        for client in self.video_list_widget.clients.values():
+            if client.current_device:
+                continue
+            av = client.get_av_stats()
+            video = client.get_video_stats()
+            audio = client.get_audio_stats()
+            lines.append(
+                f"{client.name}\n"
+                f"  A/V offset {ms(av['av_offset_ms'])}, "
+                f"audio delay {ms(av['audio_delay_ms'])}, "
+                f"{av['held_frames']} held, {av['dropped_frames']} dropped\n"
+                f"  video {video['frames']} frames, {video['dropped']} dropped, "
+                f"{video['lost']} lost\n"
+                f"  audio jitter {audio['jitter_ms']:.1f} ms, "
+                f"playout {ms(audio['playout_delay_ms'])}, "
+                f"{audio['concealed']} concealed, {audio['underruns']} underruns"
+            )
+        QMessageBox.information(
+            self, "Call Stats", "\n\n".join(lines) or "Nobody else is here yet"
+        )
+
+    def update_active_speaker(self):
+        speaker = self.speaker_detector.update(self.audio_mixer.get_levels())
+        if speaker is not None:
+            self.video_list_widget.set_active_speaker(speaker)
+
+    def update_video_subscriptions(self, sizes: dict):
+        if self.server_conn.connected:
+            self.server_conn.send_subscription(VIDEO, sizes)
+
     def send_msg(self, data_type: str = TEXT):
         selected = self.chat_widget.selected_clients()
         if len(selected) == 0:
@@ -985,6 +2043,8 @@ class MainWindow(QMainWindow):
         else:
             self.camera_menu.actions()[0].setText("📹 Disable Camera")
         self.client.camera_enabled = not self.client.camera_enabled
+        if self.server_conn.connected:
+            self.server_conn.send_media_state()
 
     def toggle_microphone(self):
         if self.client.microphone_enabled:
@@ -992,12 +2052,15 @@ class MainWindow(QMainWindow):
         else:
             self.microphone_menu.actions()[0].setText("🎤 Disable Microphone")
         self.client.microphone_enabled = not self.client.microphone_enabled
+        if self.server_conn.connected:
+            self.server_conn.send_media_state()
 
     def leave_meeting(self):
         """Handle leaving the meeting without closing the application"""
         reply = QMessageBox.question(
             self,
             "Leave Meeting",
+
             "Are you sure you want to leave the meeting?\nYou can rejoin by restarting the application.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No,
@@ -1021,1082 +2084,27 @@ class MainWindow(QMainWindow):
         """Handle window close event to properly cleanup resources."""
         if self.client.camera:
             self.client.camera.release()
+        if self.audio_mixer is not None:
+            self.audio_mixer.stop()
         super().closeEvent(event)
 
     def resizeEvent(self, event):
         """Handle dynamic resizing of main window elements"""
         super().resizeEvent(event)
-        size = event.size()
+        # a window drag sends a burst of these, lay out at most once per frame
+        if not self.resize_timer.isActive():
+            self.resize_timer.start()
+
+    def apply_resize(self):
+        width = self.width()
 
         # Adjust sidebar width based on window size
-        sidebar_width = max(250, min(400, size.width() // 3))
+        sidebar_width = max(250, min(400, width // 3))
         self.sidebar.setMinimumWidth(sidebar_width)
         self.sidebar.setMaximumWidth(sidebar_width + 50)
 
         # Adjust menu bar font size
-        menu_font_size = max(12, min(16, size.width() // 80))
-        self.setStyleSheet(
-            f"""
-            QMainWindow {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-            }}
-            QMenuBar {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #4c63d2, stop:1 #6366f1);
-                color: white;
-                font-size: {menu_font_size}px;
-                font-weight: 700;
-                padding: {max(6, menu_font_size//2)}px;
-                border-radius: 6px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }}
-            QMenuBar::item {{
-                background-color: transparent;
-                padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
-                border-radius: 6px;
-                margin: 2px;
-            }}
-            QMenuBar::item:selected {{
-                background-color: rgba(255, 255, 255, 0.2);
-            }}
-            QMenu {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: 2px solid #a5b4fc;
-                border-radius: 12px;
-                padding: 8px;
-                font-size: {max(11, menu_font_size-2)}px;
-            }}
-            QMenu::item {{
-                padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
-                border-radius: 8px;
-                margin: 2px;
-            }}
-            QMenu::item:selected {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-            }}
-        """
-        )
-
-
-class Worker(QRunnable):
-    def __init__(self, fn, *args, **kwargs):
-        super(Worker, self).__init__()
-        # Store constructor arguments (re-used for processing)
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
-
-    @pyqtSlot()
-    def run(self):
-        self.fn(*self.args, **self.kwargs)
-
-
-class Microphone:
-    def __init__(self):
-        self.stream = pa.open(
-            rate=SAMPLE_RATE,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=BLOCK_SIZE,
-        )
-
-    def get_data(self):
-        return self.stream.read(BLOCK_SIZE)
-
-
-class AudioThread(QThread):
-    def __init__(self, client, parent=None):
-        super().__init__(parent)
-        self.client = client
-        self.stream = pa.open(
-            rate=SAMPLE_RATE,
-            channels=1,
-            format=pyaudio.paInt16,
-            output=True,
-            frames_per_buffer=BLOCK_SIZE,
-        )
-        self.connected = True
-
-    def run(self):
-        if self.client.microphone is not None:
-            return
-        while self.connected:
-            self.update_audio()
-
-    def update_audio(self):
-        data = self.client.get_audio()
-        if data is not None:
-            self.stream.write(data)
-
-
-class Camera:
-    def __init__(self):
-        self.cap = cv2.VideoCapture(2)
-        if not self.cap.isOpened():
-            self.cap = cv2.VideoCapture(0)
-
-    def get_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(
-                frame, frame_size[CAMERA_RES], interpolation=cv2.INTER_AREA
-            )
-            if ENABLE_ENCODE:
-                _, frame = cv2.imencode(".jpg", frame, ENCODE_PARAM)
-            return frame
-
-
-class VideoWidget(QWidget):
-    def __init__(self, client, parent=None):
-        super().__init__(parent)
-        self.client = client
-        self.parent_window = parent
-        self.init_ui()
-
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_video)
-        self.init_video()
-
-    def init_ui(self):
-        # Modern styling without unsupported properties
-        self.setStyleSheet(
-            """
-            VideoWidget {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #4a5568, stop:1 #2d3748);
-                border: 2px solid #6366f1;
-                border-radius: 22px;
-                margin: 10px;
-            }
-            VideoWidget:hover {
-                border: 2.5px solid #a5b4fc;
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #5a67d8, stop:1 #4c51bf);
-            }
-        """
-        )
-
-        self.video_viewer = QLabel()
-        if self.client.current_device:
-            self.name_label = QLabel(f"🎥 You - {self.client.name}")
-        else:
-            self.name_label = QLabel(f"👤 {self.client.name}")
-
-        self.video_viewer.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.video_viewer.setStyleSheet(
-            """
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #1a202c, stop:1 #2d3748);
-                border-radius: 16px;
-                border: 2px solid #21262d;
-                min-height: 80px;
-            }
-        """
-        )
-
-        self.name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.name_label.setStyleSheet(
-            """
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-                font-weight: 700;
-                font-size: 13px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                border-radius: 8px;
-                padding: 6px 12px;
-                margin: 4px;
-                border: 1px solid #4c63d2;
-            }
-        """
-        )
-
-        self.layout = QVBoxLayout()
-        self.layout.setSpacing(8)
-        self.layout.setContentsMargins(12, 12, 12, 12)
-        self.layout.addWidget(self.video_viewer)
-        self.layout.addWidget(self.name_label)
-        self.setLayout(self.layout)
-
-    def init_video(self):
-        self.timer.start(30)
-
-    def update_video(self):
-        frame = self.client.get_video()
-        if frame is None:
-            frame = NOCAM_FRAME.copy()
-        elif ENABLE_ENCODE:
-            frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
-
-        frame = cv2.resize(
-            frame, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv2.INTER_AREA
-        )
-
-        if self.client.audio_data is None:
-            # replace bottom center part of the frame with nomic frame
-            nomic_h, nomic_w, _ = NOMIC_FRAME.shape
-            x, y = FRAME_WIDTH // 2 - nomic_w // 2, FRAME_HEIGHT - 50
-            frame[y : y + nomic_h, x : x + nomic_w] = NOMIC_FRAME.copy()
-
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        self.video_viewer.setPixmap(QPixmap.fromImage(q_img))
-
-    def resizeEvent(self, event):
-        """Handle dynamic resizing of video widget elements"""
-        super().resizeEvent(event)
-        size = event.size()
-
-        # Adjust font size based on widget size
-        base_font_size = max(10, min(16, size.width() // 25))
-        self.name_label.setStyleSheet(
-            f"""
-            QLabel {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-                font-weight: 700;
-                font-size: {base_font_size}px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                border-radius: 8px;
-                padding: {max(4, base_font_size//3)}px {max(8, base_font_size//2)}px;
-                margin: 4px;
-                border: 1px solid #4c63d2;
-            }}
-        """
-        )
-
-
-class VideoListWidget(QListWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.all_items = {}
-        self.init_ui()
-
-    def init_ui(self):
-        self.setFlow(QListWidget.Flow.LeftToRight)
-        self.setWrapping(True)
-        self.setResizeMode(QListWidget.ResizeMode.Adjust)
-        self.setMovement(QListWidget.Movement.Static)
-
-        self.setStyleSheet(
-            """
-            QListWidget {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #1e293b, stop:1 #0f172a);
-                border: 2px solid #374151;
-                padding: 18px;
-                border-radius: 18px;
-            }
-            QListWidget::item {
-                border: none;
-                margin: 7px;
-                border-radius: 16px;
-                background: transparent;
-            }
-            QListWidget::item:selected {
-                background: none;
-            }
-        """
-        )
-
-    def add_client(self, client):
-        video_widget = VideoWidget(client)
-
-        item = QListWidgetItem()
-        item.setFlags(
-            item.flags() & ~(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
-        )
-        if client.current_device:
-            self.insertItem(0, item)
-        else:
-            self.addItem(item)
-        item.setSizeHint(QSize(FRAME_WIDTH, FRAME_HEIGHT))
-        self.setItemWidget(item, video_widget)
-        self.all_items[client.name] = item
-        self.resize_widgets()
-
-    def resize_widgets(self, res: str = None):
-        global FRAME_WIDTH, FRAME_HEIGHT, LAYOUT_RES
-        n = self.count()
-        if res is None:
-            if n <= 1:
-                res = "900p"
-            elif n <= 4:
-                res = "480p"
-            elif n <= 6:
-                res = "360p"
-            else:
-                res = "240p"
-        new_size = frame_size[res]
-
-        if new_size == (FRAME_WIDTH, FRAME_HEIGHT):
-            return
-        else:
-            FRAME_WIDTH, FRAME_HEIGHT = new_size
-            LAYOUT_RES = res
-
-        for i in range(n):
-            self.item(i).setSizeHint(QSize(FRAME_WIDTH, FRAME_HEIGHT))
-
-    def remove_client(self, name: str):
-        self.takeItem(self.row(self.all_items[name]))
-        self.all_items.pop(name)
-        self.resize_widgets()
-
-
-class ChatWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.parent_window = parent
-        self.init_ui()
-
-    def init_ui(self):
-        # Clean modern styling without unsupported properties
-        self.setStyleSheet(
-            """
-            ChatWidget {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #f8fafc, stop:1 #e2e8f0);
-                border-radius: 28px;
-                padding: 18px;
-                border: 2px solid #c7d2fe;
-            }
-        """
-        )
-
-        self.layout = QVBoxLayout()
-        self.layout.setSpacing(20)
-        self.layout.setContentsMargins(25, 25, 25, 25)
-        self.setLayout(self.layout)
-
-        self.title_label = QLabel("💬 Chat Hub")
-        self.title_label.setStyleSheet(
-            """
-            QLabel {
-                font-size: 22px;
-                font-weight: 900;
-                color: #fff;
-                padding: 18px 24px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                border-radius: 16px;
-                margin-bottom: 10px;
-                border: 2px solid #6366f1;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-        """
-        )
-        self.layout.addWidget(self.title_label)
-
-        self.central_widget = QTextEdit(self)
-        self.central_widget.setReadOnly(True)
-        self.central_widget.setStyleSheet(
-            """
-            QTextEdit {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: 2px solid #e0e7ff;
-                border-radius: 18px;
-                padding: 18px;
-                font-size: 15px;
-                color: #334155;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                selection-background-color: #a5b4fc;
-                min-height: 180px;
-            }
-            QTextEdit:focus {
-                border: 2px solid #6366f1;
-                background: #fff;
-            }
-        """
-        )
-        self.central_widget.setSizePolicy(
-            QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Expanding
-        )
-        self.layout.addWidget(self.central_widget)
-
-        self.clients_menu = QMenu("Clients", self)
-        self.clients_menu.aboutToShow.connect(self.resize_clients_menu)
-        self.clients_menu.setStyleSheet(
-            """
-            QMenu {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: 2px solid #a5b4fc;
-                border-radius: 14px;
-                padding: 8px;
-            }
-            QMenu::item {
-                padding: 12px 18px;
-                border-radius: 10px;
-                margin: 2px;
-                font-size: 14px;
-            }
-            QMenu::item:selected {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-            }
-        """
-        )
-        self.clients_checkboxes = {}
-        self.clients_menu_actions = {}
-
-        self.select_all_checkbox, _ = self.add_client("")
-        self.clients_menu.addSeparator()
-
-        # Modern styled buttons with dynamic sizing
-        self.clients_button = QPushButton("👥 Select Recipients", self)
-        self.clients_button.setMenu(self.clients_menu)
-        self.clients_button.setStyleSheet(
-            """
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                border: none;
-                border-radius: 16px;
-                padding: 14px 26px;
-                font-size: 15px;
-                font-weight: 700;
-                color: #fff;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                min-height: 40px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #5a67d8, stop:1 #818cf8);
-            }
-            QPushButton:pressed {
-                background: #4c51bf;
-            }
-        """
-        )
-        self.layout.addWidget(self.clients_button)
-
-        self.file_button = QPushButton("📎 Send File", self)
-        self.file_button.setStyleSheet(
-            """
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #f59e0b, stop:1 #fbbf24);
-                border: none;
-                border-radius: 16px;
-                padding: 14px 26px;
-                font-size: 15px;
-                font-weight: 700;
-                color: #fff;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                min-height: 40px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #d97706, stop:1 #f59e0b);
-            }
-            QPushButton:pressed {
-                background: #b45309;
-            }
-        """
-        )
-        self.layout.addWidget(self.file_button)
-
-        self.send_layout = QHBoxLayout()
-        self.send_layout.setSpacing(15)
-        self.layout.addLayout(self.send_layout)
-
-        self.line_edit = QLineEdit(self)
-        self.line_edit.setPlaceholderText("💭 Type your message here...")
-        self.line_edit.setStyleSheet(
-            """
-            QLineEdit {
-                border: 2px solid #a5b4fc;
-                border-radius: 14px;
-                padding: 14px 20px;
-                font-size: 15px;
-                background: #ffffff;
-                color: #334155;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                min-height: 20px;
-            }
-            QLineEdit:focus {
-                border: 2px solid #6366f1;
-                outline: none;
-            }
-            QLineEdit:hover {
-                border: 2px solid #818cf8;
-            }
-        """
-        )
-        self.send_layout.addWidget(self.line_edit)
-
-        self.send_button = QPushButton("📤 Send", self)
-        self.send_button.setStyleSheet(
-            """
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #6366f1, stop:1 #818cf8);
-                border: none;
-                border-radius: 14px;
-                padding: 14px 28px;
-                font-size: 15px;
-                font-weight: 800;
-                color: #fff;
-                min-width: 90px;
-                min-height: 20px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #5a67d8, stop:1 #6366f1);
-            }
-            QPushButton:pressed {
-                background: #4c51bf;
-            }
-        """
-        )
-        self.send_layout.addWidget(self.send_button)
-
-        self.layout.addSpacing(20)
-
-        # Button container for Leave and End call buttons
-        self.button_container = QHBoxLayout()
-        self.button_container.setSpacing(12)
-        self.layout.addLayout(self.button_container)
-
-        # Leave meeting button
-        self.leave_button = QPushButton("🚪 Leave Meeting", self)
-        self.leave_button.setStyleSheet(
-            """
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #f59e0b, stop:1 #fbbf24);
-                border: none;
-                border-radius: 16px;
-                padding: 14px 24px;
-                font-size: 15px;
-                font-weight: 800;
-                color: #fff;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                min-height: 40px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #d97706, stop:1 #f59e0b);
-            }
-            QPushButton:pressed {
-                background: #b45309;
-            }
-        """
-        )
-        self.button_container.addWidget(self.leave_button)
-
-        self.end_button = QPushButton("📞 End Call", self)
-        self.end_button.setStyleSheet(
-            """
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ef4444, stop:1 #f87171);
-                border: none;
-                border-radius: 16px;
-                padding: 14px 24px;
-                font-size: 15px;
-                font-weight: 800;
-                color: #fff;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                min-height: 40px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #dc2626, stop:1 #ef4444);
-            }
-            QPushButton:pressed {
-                background: #b91c1c;
-            }
-        """
-        )
-        self.button_container.addWidget(self.end_button)
-
-    def add_client(self, name: str):
-        checkbox = QCheckBox(name, self)
-        checkbox.setChecked(True)
-        action_widget = QWidgetAction(self)
-        action_widget.setDefaultWidget(checkbox)
-        self.clients_menu.addAction(action_widget)
-
-        if name == "": 
-            checkbox.setText("Select All")
-            checkbox.stateChanged.connect(
-                lambda state: self.on_checkbox_click(state, is_select_all=True)
-            )
-            return checkbox, action_widget
-
-        checkbox.stateChanged.connect(lambda state: self.on_checkbox_click(state))
-        self.clients_checkboxes[name] = checkbox
-        self.clients_menu_actions[name] = action_widget
-        return checkbox, action_widget
-
-    def remove_client(self, name: str):
-        self.clients_menu.removeAction(self.clients_menu_actions[name])
-        self.clients_menu_actions.pop(name)
-        self.clients_checkboxes.pop(name)
-
-    def resize_clients_menu(self):
-        self.clients_menu.setMinimumWidth(self.clients_button.width())
-
-    def on_checkbox_click(self, is_checked: bool, is_select_all: bool = False):
-        if is_select_all:
-            for client_checkbox in self.clients_checkboxes.values():
-                client_checkbox.blockSignals(True)
-                client_checkbox.setChecked(is_checked)
-                client_checkbox.blockSignals(False)
-        else:
-            if not is_checked:
-                self.select_all_checkbox.blockSignals(True)
-                self.select_all_checkbox.setChecked(False)
-                self.select_all_checkbox.blockSignals(False)
-
-    def selected_clients(self):
-        selected = []
-        for name, checkbox in self.clients_checkboxes.items():
-            if checkbox.isChecked():
-                selected.append(name)
-        return tuple(selected)
-
-    def get_file(self):
-        file_path = QFileDialog.getOpenFileName(
-            None, "Select File", options=QFileDialog.Option.DontUseNativeDialog
-        )[0]
-        return file_path
-
-    def get_text(self):
-        text = self.line_edit.text()
-        self.line_edit.clear()
-        return text
-
-    def add_msg(self, from_name: str, to_name: str, msg: str):
-        timestamp = __import__("datetime").datetime.now().strftime("%H:%M")
-
-        if from_name == "You":
-            bubble_style = """
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: white;
-                margin-left: 60px;
-                text-align: right;
-            """
-            sender_style = "color: #6366f1; text-align: right; margin-left: 60px;"
-        else:
-            bubble_style = """
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #f8fafc, stop:1 #e2e8f0);
-                color: #334155;
-                margin-right: 60px;
-                border: 2px solid #a5b4fc;
-            """
-            sender_style = "color: #334155; margin-right: 60px;"
-
-        html = f"""
-        <div style="margin-bottom: 22px; font-family: 'Segoe UI', Arial, sans-serif;">
-            <div style="{sender_style} font-weight: 700; font-size: 15px; margin-bottom: 7px;">
-                {from_name} <span style="color: #64748b; font-weight: 400;">to {to_name}</span>
-                <span style="color: #6366f1; font-size: 12px; margin-left: 12px;">{timestamp}</span>
-            </div>
-            <div style="{bubble_style} padding: 18px 24px; border-radius: 22px; 
-                        display: inline-block; max-width: 80%; word-wrap: break-word;
-                        font-size: 16px; line-height: 1.5;">
-                {msg}
-            </div>
-        </div>
-        """
-        self.central_widget.append(html)
-        scrollbar = self.central_widget.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
-
-
-class LoginDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.init_ui()
-
-    def init_ui(self):
-        self.setWindowTitle("🎥 Video Conference - Join Now")
-        self.setFixedSize(420, 240)
-
-        # Clean modern styling
-        self.setStyleSheet(
-            """
-            QDialog {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                border-radius: 20px;
-            }
-            QLabel {
-                color: white;
-                font-size: 18px;
-                font-weight: 700;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QLineEdit {
-                border: 2px solid rgba(255, 255, 255, 0.5);
-                border-radius: 12px;
-                padding: 14px 18px;
-                font-size: 16px;
-                background-color: #fff;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QLineEdit:focus {
-                border: 2px solid #ffffff;
-                outline: none;
-            }
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: none;
-                border-radius: 12px;
-                padding: 14px 28px;
-                font-size: 16px;
-                font-weight: 700;
-                color: #6366f1;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #f1f5f9, stop:1 #e2e8f0);
-            }
-            QPushButton:pressed {
-                background: #e2e8f0;
-            }
-        """
-        )
-
-        self.layout = QGridLayout()
-        self.layout.setSpacing(20)
-        self.layout.setContentsMargins(35, 35, 35, 35)
-        self.setLayout(self.layout)
-
-        self.title_label = QLabel("🎥 Join Video Conference")
-        self.title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.title_label.setStyleSheet(
-            """
-            QLabel {
-                font-size: 20px;
-                font-weight: 800;
-                color: white;
-                margin-bottom: 15px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-        """
-        )
-        self.layout.addWidget(self.title_label, 0, 0, 1, 2)
-
-        self.name_label = QLabel("👤 Username:")
-        self.layout.addWidget(self.name_label, 1, 0)
-
-        self.name_edit = QLineEdit(self)
-        self.name_edit.setPlaceholderText("Enter your username...")
-        self.layout.addWidget(self.name_edit, 1, 1)
-
-        self.button = QPushButton("🚀 Join Conference", self)
-        self.layout.addWidget(self.button, 2, 0, 1, 2)
-
-        self.button.clicked.connect(self.login)
-
-    def get_name(self):
-        return self.name_edit.text()
-
-    def login(self):
-        if self.get_name() == "":
-            QMessageBox.critical(self, "Error", "Username cannot be empty")
-            return
-        if " " in self.get_name():
-            QMessageBox.critical(self, "Error", "Username cannot contain spaces")
-            return
-        self.accept()
-
-    def close(self):
-        self.reject()
-
-
-class MainWindow(QMainWindow):
-    def __init__(self, client, server_conn):
-        super().__init__()
-        self.client = client
-        self.server_conn = server_conn
-        self.audio_threads = {}
-
-        self.server_conn.add_client_signal.connect(self.add_client)
-        self.server_conn.remove_client_signal.connect(self.remove_client)
-        self.server_conn.add_msg_signal.connect(self.add_msg)
-
-        self.login_dialog = LoginDialog(self)
-        if not self.login_dialog.exec():
-            exit()
-
-        self.server_conn.name = self.login_dialog.get_name()
-        self.server_conn.start()
-        self.init_ui()
-
-    def init_ui(self):
-        self.setWindowTitle("🎥 Lets Meet - Modern Video Conference")
-        self.resize(1100, 600)
-
-        # Center the window
-        screen_geometry = self.screen().availableGeometry()
-        x = (screen_geometry.width() - 1100) // 2
-        y = (screen_geometry.height() - 600) // 2
-        self.move(x, y)
-        self.setMinimumSize(700, 400)
-
-        # Clean modern main window styling
-        self.setStyleSheet(
-            """
-            QMainWindow {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-            }
-            QMenuBar {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #4c63d2, stop:1 #6366f1);
-                color: white;
-                font-size: 14px;
-                font-weight: 700;
-                padding: 8px;
-                border-radius: 6px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QMenuBar::item {
-                background-color: transparent;
-                padding: 10px 18px;
-                border-radius: 6px;
-                margin: 2px;
-            }
-            QMenuBar::item:selected {
-                background-color: rgba(255, 255, 255, 0.2);
-            }
-            QMenu {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: 2px solid #a5b4fc;
-                border-radius: 12px;
-                padding: 8px;
-                font-size: 13px;
-            }
-            QMenu::item {
-                padding: 10px 18px;
-                border-radius: 8px;
-                margin: 2px;
-            }
-            QMenu::item:selected {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-            }
-        """
-        )
-
-        self.video_list_widget = VideoListWidget()
-        self.setCentralWidget(self.video_list_widget)
-
-        self.sidebar = QDockWidget("💬 Chat", self)
-        self.sidebar.setFeatures(QDockWidget.DockWidgetFeature.NoDockWidgetFeatures)
-        self.sidebar.setMinimumWidth(300)
-        self.sidebar.setMaximumWidth(500)
-
-        self.chat_widget = ChatWidget(self)
-        self.sidebar.setWidget(self.chat_widget)
-        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.sidebar)
-
-        self.chat_widget.send_button.clicked.connect(lambda: self.send_msg(TEXT))
-        self.chat_widget.line_edit.returnPressed.connect(lambda: self.send_msg(TEXT))
-        self.chat_widget.file_button.clicked.connect(lambda: self.send_msg(FILE))
-        self.chat_widget.leave_button.clicked.connect(self.leave_meeting)
-        self.chat_widget.end_button.clicked.connect(self.close)
-
-        self.camera_menu = self.menuBar().addMenu("📹 Camera")
-        self.microphone_menu = self.menuBar().addMenu("🎤 Microphone")
-        self.layout_menu = self.menuBar().addMenu("📐 Layout")
-
-        self.camera_menu.addAction("📹 Disable Camera", self.toggle_camera)
-        self.microphone_menu.addAction("🎤 Disable Microphone", self.toggle_microphone)
-
-        self.layout_actions = {}
-        layout_action_group = QActionGroup(self)
-        for res in frame_size.keys():
-            layout_action = layout_action_group.addAction(f"📐 {res}")
-            layout_action.setCheckable(True)
-            layout_action.triggered.connect(
-                lambda checked, res=res: self.video_list_widget.resize_widgets(res)
-            )
-            if res == LAYOUT_RES:
-                layout_action.setChecked(True)
-            self.layout_menu.addAction(layout_action)
-            self.layout_actions[res] = layout_action
-
-    def add_client(self, client):
-        self.video_list_widget.add_client(client)
-        self.layout_actions[LAYOUT_RES].setChecked(True)
-        if ENABLE_AUDIO:
-            self.audio_threads[client.name] = AudioThread(client, self)
-            self.audio_threads[client.name].start()
-        if not client.current_device:
-            self.chat_widget.add_client(client.name)
-
-    def remove_client(self, name: str):
-        self.video_list_widget.remove_client(name)
-        self.layout_actions[LAYOUT_RES].setChecked(True)
-        if ENABLE_AUDIO:
-            self.audio_threads[name].connected = False
-            self.audio_threads[name].wait()
-            self.audio_threads.pop(name)
-            print(f"Audio Thread for {name} terminated")
-        print(f"removing {name} chat...")
-        self.chat_widget.remove_client(name)
-        print(f"{name} removed")
-
-    def send_msg(self, data_type: str = TEXT):
-        selected = self.chat_widget.selected_clients()
-        if len(selected) == 0:
-            QMessageBox.critical(self, "Error", "Select at least one client")
-            return
-
-        if data_type == TEXT:
-            msg_text = self.chat_widget.get_text()
-        elif data_type == FILE:
-            filepath = self.chat_widget.get_file()
-            if not filepath:
-                return
-            msg_text = os.path.basename(filepath)
-        else:
-            print(f"{data_type} data_type not supported")
-            return
-
-        if msg_text == "":
-            QMessageBox.critical(self, "Error", f"{data_type} cannot be empty")
-            return
-
-        msg = Message(
-            self.client.name, POST, data_type, data=msg_text, to_names=selected
-        )
-        self.server_conn.send_msg(self.server_conn.main_socket, msg)
-
-        if data_type == FILE:
-            send_file_thread = Worker(self.server_conn.send_file, filepath, selected)
-            self.server_conn.threadpool.start(send_file_thread)
-            msg_text = f"Sending {msg_text}..."
-
-        self.chat_widget.add_msg("You", ", ".join(selected), msg_text)
-
-    def add_msg(self, from_name: str, msg: str):
-        self.chat_widget.add_msg(from_name, "You", msg)
-
-    def toggle_camera(self):
-        if self.client.camera_enabled:
-            self.camera_menu.actions()[0].setText("📹 Enable Camera")
-        else:
-            self.camera_menu.actions()[0].setText("📹 Disable Camera")
-        self.client.camera_enabled = not self.client.camera_enabled
-
-    def toggle_microphone(self):
-        if self.client.microphone_enabled:
-            self.microphone_menu.actions()[0].setText("🎤 Enable Microphone")
-        else:
-            self.microphone_menu.actions()[0].setText("🎤 Disable Microphone")
-        self.client.microphone_enabled = not self.client.microphone_enabled
-
-    def leave_meeting(self):
-        """Handle leaving the meeting without closing the application"""
-        reply = QMessageBox.question(
-            self,
-            "Leave Meeting",
-
-            "Are you sure you want to leave the meeting?\nYou can rejoin by restarting the application.",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No,
-        )
-
-        if reply == QMessageBox.StandardButton.Yes:
-            self.server_conn.connected = False
-            self.server_conn.disconnect_server()
-
-            self.chat_widget.add_msg(
-                "System", "You", "You have left the meeting. Please restart to rejoin."
-            )
-
-            self.chat_widget.send_button.setEnabled(False)
-            self.chat_widget.line_edit.setEnabled(False)
-            self.chat_widget.file_button.setEnabled(False)
-            self.chat_widget.clients_button.setEnabled(False)
-            self.chat_widget.leave_button.setEnabled(False)
-
-    def closeEvent(self, event):
-        """Handle window close event to properly cleanup resources."""
-        if self.client.camera:
-            self.client.camera.release()
-        super().closeEvent(event)
-
-    def resizeEvent(self, event):
-        """Handle dynamic resizing of main window elements"""
-        super().resizeEvent(event)
-        size = event.size()
-
-        # Adjust sidebar width based on window size
-        sidebar_width = max(250, min(400, size.width() // 3))
-        self.sidebar.setMinimumWidth(sidebar_width)
-        self.sidebar.setMaximumWidth(sidebar_width + 50)
-
-        # Adjust menu bar font size
-        menu_font_size = max(12, min(16, size.width() // 80))
-        self.setStyleSheet(
-            f"""
-            QMainWindow {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-            }}
-            QMenuBar {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #4c63d2, stop:1 #6366f1);
-                color: white;
-                font-size: {menu_font_size}px;
-                font-weight: 700;
-                padding: {max(6, menu_font_size//2)}px;
-                border-radius: 6px;
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }}
-            QMenuBar::item {{
-                background-color: transparent;
-                padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
-                border-radius: 6px;
-                margin: 2px;
-            }}
-            QMenuBar::item:selected {{
-                background-color: rgba(255, 255, 255, 0.2);
-            }}
-            QMenu {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #ffffff, stop:1 #f8fafc);
-                border: 2px solid #a5b4fc;
-                border-radius: 12px;
-                padding: 8px;
-                font-size: {max(11, menu_font_size-2)}px;
-            }}
-            QMenu::item {{
-                padding: {max(8, menu_font_size//1.5)}px {max(14, menu_font_size)}px;
-                border-radius: 8px;
-                margin: 2px;
-            }}
-            QMenu::item:selected {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6366f1, stop:1 #a5b4fc);
-                color: #fff;
-            }}
-        """
-        )
\ No newline at end of file
+        menu_font_size = max(12, min(16, width // 80))
+        if menu_font_size != self.menu_font_size:
+            self.menu_font_size = menu_font_size
+            self.setStyleSheet(main_window_style(menu_font_size))
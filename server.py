@@ -30,6 +30,16 @@ server_data_tracker = DataRateTracker()
 
 shutdown_event = threading.Event()
 
+# Audio framing of this meeting. Low-latency mode captures 10 ms frames;
+# aggregating frames per datagram lowers the packet rate but adds latency.
+LOW_LATENCY_AUDIO = True
+AUDIO_FRAME_MS = 10 if LOW_LATENCY_AUDIO else 20
+AUDIO_FRAMES_PER_PACKET = 2
+AUDIO_CONFIG = AudioConfig(AUDIO_FRAME_MS, AUDIO_FRAMES_PER_PACKET)
+
+# control messages whose latest value is replayed to clients joining later
+REPLAYED_DATA_TYPES = (STATE, CODECS)
+
 
 @dataclass
 class Client:
@@ -37,6 +47,15 @@ class Client:
     main_conn: socket.socket
     connected: bool
     media_addrs: dict = field(default_factory=lambda: {VIDEO: None, AUDIO: None})
+    control_state: dict = field(default_factory=dict)
+    # media -> {sender name: tile size} this client shows, every sender if missing
+    subscriptions: dict = field(default_factory=dict)
+    # largest tile size this client's video is shown at, None for any
+    video_resolution: tuple = None
+
+    def is_subscribed(self, media: str, from_name: str) -> bool:
+        names = self.subscriptions.get(media)
+        return names is None or from_name in names
 
     def send_msg( # client data sending msg
         self, from_name: str, request: str, data_type: str = None, data: any = None
@@ -68,6 +87,8 @@ def broadcast_msg( # msg broadcast kortese
     for client in all_clients:
         if client.name == from_name:
             continue
+        if not client.is_subscribed(data_type, from_name):
+            continue
         client.send_msg(from_name, request, data_type, data)
 
 
@@ -113,6 +134,32 @@ def media_server(media: str, port: int):
             broadcast_msg(msg.from_name, msg.request, msg.data_type, msg.data)
 
 
+def update_video_resolutions():
+    """Tell each sender the largest tile size its video is displayed at"""
+    all_clients = tuple(clients.values())
+    for sender in all_clients:
+        sizes = []
+        for other in all_clients:
+            if other.name == sender.name:
+                continue
+            shown = other.subscriptions.get(VIDEO)
+            if shown is None:
+                # has not subscribed, may show anyone at any size
+                sizes = None
+                break
+            if sender.name in shown:
+                sizes.append(shown[sender.name])
+        if sizes is None:
+            resolution = None
+        elif sizes:
+            resolution = (max(w for w, _ in sizes), max(h for _, h in sizes))
+        else:
+            resolution = (0, 0)  # nobody is watching, the smallest will do
+        if resolution != sender.video_resolution:
+            sender.video_resolution = resolution
+            sender.send_msg(SERVER, POST, RESOLUTION, resolution)
+
+
 def disconnect_client(client: Client):
     global clients
 
@@ -128,18 +175,23 @@ def disconnect_client(client: Client):
         print(f"[ERROR] {client.name} not in clients")
         print(clients)
         pass
+    update_video_resolutions()
 
 
 def handle_main_conn(name: str):
     client: Client = clients[name]
     conn = client.main_conn
 
-    for client_name in clients:
-        if client_name == name:
+    client.send_msg(SERVER, POST, CONFIG, AUDIO_CONFIG)
+    for other in tuple(clients.values()):
+        if other.name == name:
             continue
-        client.send_msg(client_name, ADD)
+        client.send_msg(other.name, ADD)
+        for data_type, data in tuple(other.control_state.items()):
+            client.send_msg(other.name, POST, data_type, data)
 
     broadcast_msg(name, ADD)
+    update_video_resolutions()
 
     while client.connected:
         msg_bytes = conn.recv_bytes()
@@ -157,6 +209,12 @@ def handle_main_conn(name: str):
         print(msg)
         if msg.request == DISCONNECT:
             break
+        if msg.request == SUBSCRIBE:
+            client.subscriptions[msg.data_type] = dict(msg.data)
+            update_video_resolutions()
+            continue
+        if msg.request == POST and msg.data_type in REPLAYED_DATA_TYPES:
+            client.control_state[msg.data_type] = msg.data
         multicast_msg(name, msg.request, msg.to_names, msg.data_type, msg.data)
 
     disconnect_client(client)
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque
+
+
+class AVSyncController:
+    """Holds one sender's video back to match the playout of its audio.
+
+    Both streams carry the sender's capture time. The audio delay is how
+    long after capture a block is played here; a video frame is released
+    once that delay has passed since it was captured. Frames are never
+    held longer than max_hold, and are shown straight away when there has
+    been no audio for audio_timeout seconds (muted or silent sender).
+    """
+
+    def __init__(
+        self, max_hold: float = 0.5, max_frames: int = 30, audio_timeout: float = 5.0
+    ):
+        self.max_hold = max_hold
+        self.audio_timeout = audio_timeout
+
+        self.lock = threading.Lock()
+        # (capture time, arrival, sender seq, frame)
+        self.frames = deque(maxlen=max_frames)
+        self.audio_delay = None  # seconds, includes the clock offset to the sender
+        self.last_audio = 0.0
+        # capture time of the frame shown minus that of the audio heard
+        self.offsets = deque(maxlen=100)
+        self.dropped = 0
+
+    def on_audio_played(self, timestamp: float):
+        now = time.time()
+        delay = now - timestamp
+        with self.lock:
+            # smoothed, audio playout has some jitter of its own
+            if self.audio_delay is None:
+                self.audio_delay = delay
+            else:
+                self.audio_delay += (delay - self.audio_delay) / 8
+            self.last_audio = now
+
+    def push_video(self, timestamp: float, frame, seq: int = None):
+        with self.lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append((timestamp, time.time(), seq, frame))
+
+    def pop_due(self) -> list:
+        """Frames that are due for display, oldest first, as (timestamp, seq, frame)"""
+        now = time.time()
+        with self.lock:
+            following = (
+                self.audio_delay is not None
+                and now - self.last_audio < self.audio_timeout
+            )
+            due = []
+            while self.frames:
+                timestamp, arrival, seq, frame = self.frames[0]
+                if (
+                    following
+                    and timestamp + self.audio_delay > now
+                    and now - arrival < self.max_hold
+                ):
+                    break
+                self.frames.popleft()
+                due.append((timestamp, seq, frame))
+            if due and following:
+                self.offsets.append(due[-1][0] - (now - self.audio_delay))
+            return due
+
+    def clear_video(self):
+        with self.lock:
+            self.frames.clear()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            offsets = list(self.offsets)
+            return {
+                "av_offset_ms": sum(offsets) / len(offsets) * 1000 if offsets else None,
+                "audio_delay_ms": (
+                    self.audio_delay * 1000 if self.audio_delay is not None else None
+                ),
+                "held_frames": len(self.frames),
+                "dropped_frames": self.dropped,
+            }
@@ -0,0 +1,578 @@
+import pickle
+import time
+import threading
+
+import cv2
+import numpy as np
+
+from constants import TileFrame, MediaPacket
+
+
+class LatestFrameSlot:
+    """Single-slot buffer that always holds the freshest frame.
+
+    A frame overwritten before anyone took it is counted as dropped. When
+    frames carry the sender's sequence number, gaps in it are counted as
+    lost before they ever reached the slot.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.timestamp = None
+        self.seq = 0
+        self.taken_seq = 0
+        self.dropped = 0
+        self.source_seq = None
+        self.lost = 0
+
+    def put(self, frame, timestamp: float = None, source_seq: int = None):
+        with self.cond:
+            if self.seq > self.taken_seq:
+                self.dropped += 1
+            self.seq += 1
+            self.frame = frame
+            self.timestamp = time.time() if timestamp is None else timestamp
+            if source_seq is not None:
+                if self.source_seq is not None and source_seq > self.source_seq + 1:
+                    self.lost += source_seq - self.source_seq - 1
+                self.source_seq = source_seq
+            self.cond.notify_all()
+
+    def take(self, timeout: float = None):
+        """Wait for a frame newer than the last one taken and consume it"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > self.taken_seq, timeout):
+                return None
+            self.taken_seq = self.seq
+            return self.seq, self.timestamp, self.frame
+
+    def peek(self):
+        with self.cond:
+            return self.seq, self.timestamp, self.frame
+
+    def has_new(self, since_seq: int) -> bool:
+        return self.seq > since_seq
+
+    def get_stats(self) -> dict:
+        with self.cond:
+            return {"frames": self.seq, "dropped": self.dropped, "lost": self.lost}
+
+
+class CaptureThread(threading.Thread):
+    """Reads a cv2.VideoCapture as fast as it delivers into a LatestFrameSlot"""
+
+    def __init__(self, cap, slot: LatestFrameSlot, retry_delay: float = 0.1):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.slot = slot
+        self.retry_delay = retry_delay
+        self.active = threading.Event()
+        self.active.set()
+        self.stopped = threading.Event()
+        self.captured = 0
+        self.failed = 0
+
+    def run(self):
+        while not self.stopped.is_set():
+            # paused while the camera is disabled
+            if not self.active.wait(timeout=0.5):
+                continue
+            ret, frame = self.cap.read()
+            if not ret:
+                self.failed += 1
+                time.sleep(self.retry_delay)
+                continue
+            self.captured += 1
+            self.slot.put(frame, time.time())
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        self.active.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.active.set()
+
+    def get_stats(self) -> dict:
+        stats = self.slot.get_stats()
+        stats.update(captured=self.captured, failed=self.failed)
+        return stats
+
+
+def jpeg_params(quality: int) -> list:
+    return [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+
+
+def encode_jpeg(image, params: list):
+    ok, buf = cv2.imencode(".jpg", image, params)
+    return buf if ok else None
+
+
+# libjpeg can scale by 1/2, 1/4 and 1/8 while decoding, skipping most of the IDCT
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+# start-of-frame markers carry the image size (DHT, JPG and DAC share the range)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(buf):
+    """(width, height) from the JPEG header, None if it cannot be found"""
+    data = bytes(buf)
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker in JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[i + 5 : i + 7], "big")
+            width = int.from_bytes(data[i + 7 : i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2 : i + 4], "big")
+    return None
+
+
+def decode_jpeg(buf, size: tuple = None):
+    """Decode, downscaled in the DCT domain as far as size (w, h) allows"""
+    flag = cv2.IMREAD_COLOR
+    full_size = jpeg_size(buf) if size is not None else None
+    if full_size is not None:
+        for factor, reduced in REDUCED_DECODE_FLAGS.items():
+            if full_size[0] // factor >= size[0] and full_size[1] // factor >= size[1]:
+                flag = reduced
+                break
+    return cv2.imdecode(buf, flag)
+
+
+class EncodeTimer:
+    """Times the encodes of one stream.
+
+    Frames are encoded one at a time on the sending thread: a JPEG of the
+    largest ladder rung takes a few milliseconds, well inside a frame.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.encoded = 0
+        self.encode_time = 0.0
+        self.last_encode_time = 0.0
+
+    def encode(self, encode_fn, *args):
+        start = time.perf_counter()
+        result = encode_fn(*args)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.encoded += 1
+            self.encode_time += elapsed
+            self.last_encode_time = elapsed
+        return result
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            avg = self.encode_time / self.encoded if self.encoded else 0.0
+            return {
+                "encoded": self.encoded,
+                "avg_encode_ms": avg * 1000,
+                "last_encode_ms": self.last_encode_time * 1000,
+            }
+
+
+class BitrateController:
+    """Closed-loop control of JPEG quality and capture resolution.
+
+    Quality is nudged every frame towards target_bitrate (bytes/s) and no
+    frame may exceed packet_budget. When quality bottoms out the resolution
+    steps down the ladder, and it steps back up when there is headroom.
+    Loss/RTT reports, when a receiver sends them, scale the target. Receivers
+    can cap the resolution at the largest size they actually display.
+    """
+
+    def __init__(
+        self,
+        resolutions: list,
+        target_bitrate: float,
+        packet_budget: int,
+        start_index: int = 0,
+        min_quality: int = 30,
+        max_quality: int = 90,
+        quality_step: int = 5,
+        fps: float = 30.0,
+        hold_time: float = 2.0,
+    ):
+        self.resolutions = resolutions
+        self.res_index = start_index
+        self.max_index = len(resolutions) - 1
+        self.base_bitrate = target_bitrate
+        self.target_bitrate = target_bitrate
+        self.min_bitrate = target_bitrate / 8
+        self.packet_budget = packet_budget
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.quality_step = quality_step
+        self.quality = max_quality
+        self.fps = fps
+        self.hold_time = hold_time
+
+        self.lock = threading.Lock()
+        self.last_frame_time = None
+        self.last_res_change = 0.0
+        self.avg_frame_bytes = 0.0
+        self.min_rtt = None
+        self.oversize = 0
+
+    @property
+    def resolution(self):
+        return self.resolutions[self.res_index]
+
+    def on_oversize(self, size: int) -> bool:
+        """Frame exceeded the packet budget; returns False if nothing is left to lower"""
+        with self.lock:
+            self.oversize += 1
+            if self.quality > self.min_quality:
+                # jump proportionally, a re-encode has to fit right away
+                scale = self.packet_budget / size
+                self.quality = max(self.min_quality, int(self.quality * scale) - 2)
+                return True
+            if self.res_index > 0:
+                self._set_res_index(self.res_index - 1)
+                return True
+            return False
+
+    def on_frame(self, size: int):
+        with self.lock:
+            now = time.time()
+            if self.last_frame_time is not None:
+                interval = max(1e-3, now - self.last_frame_time)
+                self.fps = 0.9 * self.fps + 0.1 * (1 / interval)
+            self.last_frame_time = now
+            self.avg_frame_bytes = 0.8 * self.avg_frame_bytes + 0.2 * size
+
+            frame_budget = min(self.packet_budget, self.target_bitrate / self.fps)
+            if self.avg_frame_bytes > 1.1 * frame_budget:
+                if self.quality > self.min_quality:
+                    self.quality = max(self.min_quality, self.quality - self.quality_step)
+                elif self.res_index > 0 and self._can_change_res(now):
+                    self._set_res_index(self.res_index - 1)
+            elif self.avg_frame_bytes < 0.7 * frame_budget:
+                if self.quality < self.max_quality:
+                    self.quality = min(self.max_quality, self.quality + 1)
+                elif (
+                    self.res_index < self.max_index
+                    and self.avg_frame_bytes < 0.4 * frame_budget
+                    and self._can_change_res(now)
+                ):
+                    self._set_res_index(self.res_index + 1)
+
+    def on_feedback(self, loss: float = None, rtt: float = None):
+        with self.lock:
+            congested = False
+            if loss is not None and loss > 0.02:
+                self.target_bitrate *= 1 - min(0.5, loss)
+                congested = True
+            if rtt is not None:
+                self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+                if rtt > 1.5 * self.min_rtt + 0.02:
+                    self.target_bitrate *= 0.85
+                    congested = True
+            if not congested:
+                self.target_bitrate += 0.05 * self.base_bitrate
+            self.target_bitrate = max(
+                self.min_bitrate, min(self.base_bitrate, self.target_bitrate)
+            )
+
+    def set_max_resolution(self, size: tuple = None):
+        """Cap the ladder at the smallest rung that covers size (w, h)"""
+        with self.lock:
+            self.max_index = len(self.resolutions) - 1
+            if size is not None:
+                for index, (width, height) in enumerate(self.resolutions):
+                    if width >= size[0] and height >= size[1]:
+                        self.max_index = index
+                        break
+            if self.res_index > self.max_index:
+                self._set_res_index(self.max_index)
+
+    def _can_change_res(self, now: float) -> bool:
+        return now - self.last_res_change >= self.hold_time
+
+    def _set_res_index(self, index: int):
+        self.res_index = index
+        self.last_res_change = time.time()
+        # start the new resolution in the middle of the quality range
+        self.quality = (self.min_quality + self.max_quality) // 2
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "quality": self.quality,
+                "resolution": self.resolution,
+                "max_resolution": self.resolutions[self.max_index],
+                "target_bitrate": self.target_bitrate,
+                "bitrate": self.avg_frame_bytes * self.fps,
+                "fps": self.fps,
+                "oversize": self.oversize,
+            }
+
+
+class ChangeDetector:
+    """Suppresses frames that are nearly identical to the last one sent.
+
+    Frames are compared as small grayscale thumbnails: a frame is sent when
+    the mean absolute difference, or the fraction of noticeably changed
+    pixels, crosses its threshold. A refresh frame still goes out every
+    refresh_interval seconds.
+    """
+
+    def __init__(
+        self,
+        mean_threshold: float = 1.5,
+        pixel_threshold: int = 12,
+        area_threshold: float = 0.01,
+        refresh_interval: float = 2.0,
+        thumb_size: tuple = (32, 24),
+    ):
+        self.mean_threshold = mean_threshold
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.refresh_interval = refresh_interval
+        self.thumb_size = thumb_size
+
+        self.reference = None
+        self.last_sent_time = 0.0
+        self.last_diff = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self.refreshed = 0
+
+    def thumbnail(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        return cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def should_send(self, frame) -> bool:
+        now = time.time()
+        thumb = self.thumbnail(frame)
+        if self.reference is None:
+            return self._mark_sent(thumb, now)
+
+        diff = np.abs(thumb.astype(np.int16) - self.reference.astype(np.int16))
+        self.last_diff = float(diff.mean())
+        changed = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        if self.last_diff >= self.mean_threshold or changed >= self.area_threshold:
+            return self._mark_sent(thumb, now)
+        if now - self.last_sent_time >= self.refresh_interval:
+            self.refreshed += 1
+            return self._mark_sent(thumb, now)
+
+        self.skipped += 1
+        return False
+
+    def force_next(self):
+        self.reference = None
+
+    def _mark_sent(self, thumb, now: float) -> bool:
+        # the reference only moves on send, so slow drift still adds up
+        self.reference = thumb
+        self.last_sent_time = now
+        self.sent += 1
+        return True
+
+    def get_stats(self) -> dict:
+        total = self.sent + self.skipped
+        return {
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "refreshed": self.refreshed,
+            "skip_ratio": self.skipped / total if total else 0.0,
+            "last_diff": self.last_diff,
+        }
+
+
+def payload_size(payload) -> int:
+    if isinstance(payload, MediaPacket):
+        return payload_size(payload.payload)
+    if hasattr(payload, "nbytes"):
+        return payload.nbytes
+    return len(payload)
+
+
+def packet_size(packet: MediaPacket) -> int:
+    """Bytes the packet takes once pickled, containers and headers included"""
+    return len(pickle.dumps(packet))
+
+
+def tile_edges(length: int, tile_size: int):
+    return np.arange(0, length, tile_size)
+
+
+class TileEncoder:
+    """Dirty-region codec: sends only the tiles that changed.
+
+    A tile is dirty when enough of its pixels changed noticeably against
+    the encoder's reference frame; dirty tiles are packed side by side into
+    one JPEG. A full-frame JPEG keyframe goes out every keyframe_interval
+    seconds, on resize, whenever a receiver asks for one, and when so much
+    changed that packing tiles would not be smaller.
+    """
+
+    def __init__(
+        self,
+        tile_size: int = 64,
+        pixel_threshold: int = 12,
+        dirty_area: float = 0.01,
+        keyframe_interval: float = 5.0,
+        max_dirty_ratio: float = 0.5,
+    ):
+        self.tile_size = tile_size
+        self.pixel_threshold = pixel_threshold
+        self.dirty_area = dirty_area
+        self.keyframe_interval = keyframe_interval
+        self.max_dirty_ratio = max_dirty_ratio
+
+        self.reference = None
+        self.seq = 0
+        self.last_keyframe = 0.0
+        self.keyframe_requested = True
+        self.pending = None
+        self.keyframes = 0
+        self.tiles_sent = 0
+        self.tiles_total = 0
+
+    def request_keyframe(self):
+        self.keyframe_requested = True
+
+    def changed_tiles(self, frame) -> list:
+        diff = cv2.absdiff(frame, self.reference)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        changed = (diff > self.pixel_threshold).astype(np.uint32)
+        ys = tile_edges(frame.shape[0], self.tile_size)
+        xs = tile_edges(frame.shape[1], self.tile_size)
+        counts = np.add.reduceat(np.add.reduceat(changed, ys, axis=0), xs, axis=1)
+        heights = np.diff(np.append(ys, frame.shape[0]))
+        widths = np.diff(np.append(xs, frame.shape[1]))
+        areas = counts / np.outer(heights, widths)
+        return np.flatnonzero(areas >= self.dirty_area).tolist()
+
+    def pack(self, frame, indices: list):
+        """Copy the tiles into a near-square mosaic, in order, row by row"""
+        ts = self.tile_size
+        cols = -(-frame.shape[1] // ts)
+        mosaic_cols = int(np.ceil(np.sqrt(len(indices))))
+        mosaic_rows = -(-len(indices) // mosaic_cols)
+        mosaic = np.zeros((mosaic_rows * ts, mosaic_cols * ts, 3), np.uint8)
+        for i, index in enumerate(indices):
+            row, col = divmod(index, cols)
+            tile = frame[row * ts : (row + 1) * ts, col * ts : (col + 1) * ts]
+            y, x = divmod(i, mosaic_cols)
+            th, tw = tile.shape[:2]
+            mosaic[y * ts : y * ts + th, x * ts : x * ts + tw] = tile
+        return mosaic
+
+    def encode(self, frame, params: list):
+        """Encode frame as a TileFrame, or None when nothing changed.
+
+        The reference only moves on commit(), so a result that gets
+        dropped (e.g. over the packet budget) can simply be re-encoded.
+        """
+        h, w = frame.shape[:2]
+        total = -(-h // self.tile_size) * -(-w // self.tile_size)
+        keyframe = (
+            self.keyframe_requested
+            or self.reference is None
+            or self.reference.shape != frame.shape
+            or time.time() - self.last_keyframe >= self.keyframe_interval
+        )
+        indices = [] if keyframe else self.changed_tiles(frame)
+        if len(indices) > total * self.max_dirty_ratio:
+            keyframe, indices = True, []
+        elif not keyframe and not indices:
+            return None
+
+        image = frame if keyframe else self.pack(frame, indices)
+        buf = encode_jpeg(image, params)
+        if buf is None:
+            return None
+        self.pending = (frame, keyframe, total)
+        return TileFrame(self.seq + 1, (w, h), self.tile_size, keyframe, indices, buf)
+
+    def commit(self, tile_frame: TileFrame):
+        frame, keyframe, total = self.pending
+        self.pending = None
+        self.seq = tile_frame.seq
+        self.tiles_sent += total if keyframe else len(tile_frame.tiles)
+        self.tiles_total += total
+        if keyframe:
+            self.reference = frame.copy()
+            self.keyframe_requested = False
+            self.last_keyframe = time.time()
+            self.keyframes += 1
+            return
+        ts = self.tile_size
+        cols = -(-frame.shape[1] // ts)
+        for index in tile_frame.tiles:
+            row, col = divmod(index, cols)
+            tile = np.s_[row * ts : (row + 1) * ts, col * ts : (col + 1) * ts]
+            self.reference[tile] = frame[tile]
+
+    def get_stats(self) -> dict:
+        total = self.tiles_total
+        return {
+            "keyframes": self.keyframes,
+            "tiles_sent": self.tiles_sent,
+            "tile_ratio": self.tiles_sent / total if total else 0.0,
+        }
+
+
+class TileDecoder:
+    """Rebuilds frames from TileFrames; needs a keyframe after any gap"""
+
+    def __init__(self):
+        self.frame = None
+        self.seq = None
+
+    def reset(self):
+        self.frame = None
+        self.seq = None
+
+    def decode(self, tile_frame: TileFrame):
+        """Return the updated frame, or None if a keyframe is needed first"""
+        w, h = tile_frame.size
+        image = cv2.imdecode(tile_frame.image, cv2.IMREAD_COLOR)
+        if image is None:
+            self.reset()
+            return None
+        if tile_frame.keyframe:
+            if image.shape[:2] != (h, w):
+                self.reset()
+                return None
+            self.frame = image
+            self.seq = tile_frame.seq
+            return self.frame.copy()
+        if (
+            self.frame is None
+            or self.frame.shape[:2] != (h, w)
+            or tile_frame.seq != self.seq + 1
+        ):
+            self.reset()
+            return None
+
+        ts = tile_frame.tile_size
+        cols = -(-w // ts)
+        mosaic_cols = image.shape[1] // ts
+        for i, index in enumerate(tile_frame.tiles):
+            row, col = divmod(index, cols)
+            y, x = divmod(i, mosaic_cols)
+            th = min(ts, h - row * ts)
+            tw = min(ts, w - col * ts)
+            self.frame[row * ts : row * ts + th, col * ts : col * ts + tw] = image[
+                y * ts : y * ts + th, x * ts : x * ts + tw
+            ]
+        self.seq = tile_frame.seq
+        # the network thread keeps patching self.frame, hand out a copy
+        return self.frame.copy()